@@ -0,0 +1,66 @@
+import base64
+import io
+import os
+from functools import lru_cache
+
+import numpy as np
+
+# Rink image cache. The JPEG is decoded once per size, saved as a .npy file and
+# memory-mapped by every process, and the base64 data URI the Plotly map embeds
+# is encoded once and kept in memory.
+
+RINK_IMAGE = "ice hockey rink.jpg"
+ASSET_DIR = "asset_cache"
+
+# Widest the image is ever drawn in each view (never upscaled past the source)
+VIEW_WIDTHS = {
+    "rink_map": 612,   # matplotlib rink in the Rink Map tab
+    "heatmap": 1000,   # Plotly layout image in map.py
+}
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def _decode(path, max_width):
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+        if max_width and img.width > max_width:
+            height = round(img.height * max_width / img.width)
+            img = img.resize((max_width, height), Image.LANCZOS)
+        return img.copy()
+
+
+@lru_cache(maxsize=8)
+def _rink_array(path, max_width, stamp):
+    name = f"{os.path.splitext(os.path.basename(path))[0].replace(' ', '_')}_{max_width or 'full'}_{stamp}.npy"
+    cached = os.path.join(ASSET_DIR, name)
+    if not os.path.exists(cached):
+        os.makedirs(ASSET_DIR, exist_ok=True)
+        tmp_path = f"{cached}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(_decode(path, max_width)))
+        os.replace(tmp_path, cached)
+    # Read-only memory map: every session shares the same pages
+    return np.load(cached, mmap_mode="r")
+
+
+def rink_array(view="rink_map", path=RINK_IMAGE):
+    # Decoded RGB pixels (height x width x 3, uint8) sized for the given view
+    return _rink_array(path, VIEW_WIDTHS.get(view), _source_stamp(path))
+
+
+@lru_cache(maxsize=8)
+def _rink_data_uri(path, max_width, quality, stamp):
+    buffer = io.BytesIO()
+    _decode(path, max_width).save(buffer, format="JPEG", quality=quality, optimize=True)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def rink_data_uri(view="heatmap", path=RINK_IMAGE, quality=80):
+    # Pre-encoded JPEG data URI sized for the given view
+    return _rink_data_uri(path, VIEW_WIDTHS.get(view), quality, _source_stamp(path))
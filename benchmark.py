@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Headless benchmarks for the ingest, data load and tab render paths.
+# Generates a synthetic league (see synthetic_league.py), ingests it with
+# build_db.py and drives final_project.py through Streamlit's AppTest.
+#
+#   python benchmark.py --teams 32 --seasons 3
+#   python benchmark.py --json bench.json --baseline bench_baseline.json
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, APP_DIR)
+
+from tab_names import TAB_NAMES as TABS
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def bench_ingest(csv_dir, db_path):
+    import build_db
+
+    results = {}
+    results["ingest_full_ms"], _ = timed(build_db.build, db_path, csv_dir, full=True)
+    results["ingest_unchanged_ms"], _ = timed(build_db.build, db_path, csv_dir)
+
+    # Touch one team's file and re-ingest only that file
+    changed = os.path.join(csv_dir, "flyers_standard_2024.csv")
+    with open(changed, "a", encoding="utf-8") as f:
+        f.write("\n")
+    results["ingest_one_file_ms"], _ = timed(build_db.build, db_path, csv_dir)
+    return results
+
+
+def bench_data_load(db_path):
+    import streamlit as st
+    import data_store
+
+    data_store.DB_PATH = db_path
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    results = {}
+    results["load_data_cold_ms"], _ = timed(data_store.load_data)
+    results["load_data_warm_ms"], _ = timed(data_store.load_data)
+    results["query_skaters_cold_ms"], _ = timed(data_store.query_skaters, min_gp=10)
+    results["query_skaters_warm_ms"], _ = timed(data_store.query_skaters, min_gp=10)
+    return results
+
+
+def bench_tabs(db_path, timeout=120):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    import data_store
+
+    data_store.DB_PATH = db_path
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+    results = {}
+    at = AppTest.from_file(os.path.join(APP_DIR, "final_project.py"), default_timeout=timeout)
+    results["app_first_run_ms"], _ = timed(at.run)
+    for tab in TABS:
+        # AppTest doesn't keep a tab selection between runs, so select it every time
+        at.session_state["active_tab"] = tab
+        cold_ms, _ = timed(at.run)
+        at.session_state["active_tab"] = tab
+        warm_ms, _ = timed(at.run)
+        if at.exception:
+            raise RuntimeError(f"{tab} raised: {at.exception[0].value}")
+        results[f"tab[{tab}]_cold_ms"] = cold_ms
+        results[f"tab[{tab}]_warm_ms"] = warm_ms
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, base_ms in baseline.items():
+        if name.endswith("_ms") and name in results and base_ms > 0 and results[name] > base_ms * (1 + tolerance):
+            regressions.append(f"{name}: {results[name]:.1f} ms vs {base_ms:.1f} ms baseline")
+    return regressions
+
+
+def run(teams, seasons, skaters, keep_dir=None):
+    import synthetic_league
+
+    work_dir = keep_dir or tempfile.mkdtemp(prefix="nhl_bench_")
+    csv_dir = os.path.join(work_dir, "csv")
+    db_path = os.path.join(work_dir, "bench.db")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    # The app resolves the rink image relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(APP_DIR)
+    try:
+        synthetic_league.generate(csv_dir, teams, seasons, skaters)
+        results = {"teams": teams, "seasons": seasons, "skaters_per_team": skaters}
+        results.update(bench_ingest(csv_dir, db_path))
+        results.update(bench_data_load(db_path))
+        results.update(bench_tabs(db_path))
+    finally:
+        os.chdir(cwd)
+        if keep_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingest, data load and tab rendering headlessly.")
+    parser.add_argument("--teams", type=int, default=32)
+    parser.add_argument("--seasons", type=int, default=1)
+    parser.add_argument("--skaters", type=int, default=30)
+    parser.add_argument("--keep", help="generate into this folder and keep it")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run(args.teams, args.seasons, args.skaters, args.keep)
+    print(f"\n{args.teams} teams x {args.seasons} season(s), {args.skaters} skaters per team")
+    for name, value in results.items():
+        if name.endswith("_ms"):
+            print(f"  {name:<40} {value:>10.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ Regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\n✅ No regressions against baseline")
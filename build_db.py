@@ -1,30 +1,846 @@
 import sqlite3
 import pandas as pd
 import os
-#Used chat GPT to build this databasing app using SQL lite package in python 
+import hashlib
+import csv
+import itertools
+import importlib.util
+import argparse
+import time
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import shots
+from features import FEATURE_MIN_GP, PLAYER_FEATURES, SKATER_TAB_MIN_GP
+#Used chat GPT to build this databasing app using SQL lite package in python
 #The intention behind this was to allow for the app to run and be hosted by Streamlit online
 
 # Constants
 DB_NAME = "nhl_data.db"  # Name your DB generically since you'll expand
 CSV_FOLDER = "."         # Folder where CSVs are stored (same as script for now)
+PARALLEL_MIN_FILES = 16  # fewer changed files than this are parsed in-process
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def table_name_for(filename):
+    return filename.replace(".csv", "").lower().replace("-", "_")
+
+
+# Files are named <team>_<kind>_<season>.csv and go into one table per kind,
+# partitioned by (Team, Season). "nhl" files hold one row per team for the
+# whole league and are partitioned by Season only.
+# Game logs arrive in batches (<team>_games_<season>_<batch>.csv, e.g. one per
+# day) and are appended to their partition instead of replacing it.
+# Shot events (<team>_shots_<season>[_<batch>].csv) don't go into SQLite rows:
+# each file becomes a part of the columnar store in shots.py, and only the
+# binned density grids are written to the database.
+LEAGUE_TEAM = "nhl"
+TEAM_TABLES = {"standard": "skater_standard", "advanced": "skater_advanced", "misc": "skater_misc", "goalie": "goalie_stats"}
+LEAGUE_TABLES = {"team_stats": "team_stats", "advanced": "team_advanced"}
+APPEND_TABLES = {"games": "skater_games"}
+GAME_KEYS = ["Date", "Player"]   # one row per player per game
+EVENT_STORES = {"shots": "shot_events"}
+FILE_PATTERN = re.compile(
+    r"(?P<team>[a-z0-9]+)_(?P<kind>team_stats|standard|advanced|misc|goalie|games|shots)_(?P<season>\d{4})(?:_(?P<batch>[a-z0-9]+))?"
+)
+
+
+def partition_for(filename):
+    # Returns (table, team, season); unrecognised files keep a table of their own
+    stem = table_name_for(filename)
+    match = FILE_PATTERN.fullmatch(stem)
+    if not match:
+        return stem, None, None
+    team, kind, season = match.group("team"), match.group("kind"), int(match.group("season"))
+    if kind in APPEND_TABLES and team != LEAGUE_TEAM:
+        return APPEND_TABLES[kind], team, season
+    if kind in EVENT_STORES and team != LEAGUE_TEAM:
+        return EVENT_STORES[kind], team, season
+    if match.group("batch"):
+        return stem, None, None
+    if team == LEAGUE_TEAM:
+        if kind in LEAGUE_TABLES:
+            return LEAGUE_TABLES[kind], None, season
+        return stem, None, None
+    if kind in TEAM_TABLES:
+        return TEAM_TABLES[kind], team, season
+    return stem, None, None
+
+
+# pyarrow's multithreaded reader is much faster on big dumps; the default
+# engine gives the same frames when it isn't installed
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+# Always read as text: pyarrow would turn "m:ss" ice times and dates into time/date values
+TEXT_COLUMNS = ["Date", "TOI", "ATOI", "TOI/60", "TOI(EV)", "MIN"]
+
+
+def _read_csv_pyarrow(path):
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(itertools.islice(csv.reader(f), 1, None), [])
+    convert = pv.ConvertOptions(
+        column_types={name: pa.string() for name in TEXT_COLUMNS if name in header}, strings_can_be_null=True
+    )
+    table = pv.read_csv(path, read_options=pv.ReadOptions(skip_rows=1), convert_options=convert)
+    # All-empty columns come back as null type; the default engine reads them as float NaN
+    table = table.cast(pa.schema([pa.field(f.name, pa.float64()) if pa.types.is_null(f.type) else f for f in table.schema]))
+    # The league tables leave the team name column unlabeled
+    return table.to_pandas().rename(columns={"": "Team"})
+
+
+def read_stats_csv(path):
+    # Sports-Reference exports have a group row ("Corsi (EV)", "Scoring", ...) above
+    # the real column names, so use the second row as the header
+    if CSV_ENGINE == "pyarrow":
+        return _read_csv_pyarrow(path)
+    df = pd.read_csv(path, header=1, dtype=dict.fromkeys(TEXT_COLUMNS, "str"))
+    # The league tables leave the team name column unlabeled
+    return df.rename(columns={"Unnamed: 1": "Team"})
+
+
+def read_shots_csv(path):
+    # Event exports have a single header row and can run to millions of rows
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    missing = [col for col in shots.SHOT_COLUMNS if col not in header]
+    if missing:
+        raise ValueError(f"shot events are missing {', '.join(missing)}")
+    return pd.read_csv(path, usecols=list(shots.SHOT_COLUMNS), dtype=shots.SHOT_COLUMNS, engine=CSV_ENGINE)
+
+
+def parse_file(folder, filename, digest):
+    # Runs in a worker process; returns the frame or the error message
+    try:
+        path = os.path.join(folder, filename)
+        df = read_shots_csv(path) if partition_for(filename)[0] in EVENT_STORES.values() else read_stats_csv(path)
+        missing = [key for key in GAME_KEYS if key not in df.columns]
+        if partition_for(filename)[0] in APPEND_TABLES.values() and missing:
+            raise ValueError(f"game log is missing {', '.join(missing)}")
+    except Exception as e:
+        return filename, digest, None, str(e)
+    return filename, digest, df, None
+
+
+def parse_files(folder, changed, workers=None):
+    # Parse in a process pool once there are enough files to pay for starting it
+    workers = workers or os.cpu_count() or 1
+    if len(changed) < PARALLEL_MIN_FILES or workers == 1:
+        return [parse_file(folder, filename, digest) for filename, digest in changed]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(parse_file, folder, filename, digest) for filename, digest in changed]
+        return [future.result() for future in futures]
+
+
+def sql_type(series):
+    if pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        return "REAL"
+    return "TEXT"
+
+
+def _rows(df):
+    # Converted column by column: an object array turns numpy scalars into plain
+    # Python values sqlite3 can bind, and missing values become None (NULL)
+    columns = []
+    for col in df.columns:
+        values = df[col].to_numpy(dtype=object, copy=True)
+        values[pd.isna(values)] = None
+        columns.append(values.tolist())
+    return zip(*columns)
+
+
+def write_table(conn, table_name, df):
+    columns = ", ".join(f'"{col}" {sql_type(df[col])}' for col in df.columns)
+    placeholders = ", ".join("?" for _ in df.columns)
+
+    conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    conn.execute(f'CREATE TABLE "{table_name}" ({columns})')
+    conn.executemany(f'INSERT INTO "{table_name}" VALUES ({placeholders})', _rows(df))
+
+
+def create_partition_index(conn, table_name, keys):
+    key_list = ", ".join(f'"{key}"' for key in keys)
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_partition" ON "{table_name}" ({key_list})')
+
+
+def ensure_partitioned_table(conn, table_name, df, keys, index=True):
+    # index=False leaves the partition index to the caller (bulk loads build it once at the end)
+    existing = [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+    if not existing:
+        columns = ", ".join(f'"{col}" {sql_type(df[col])}' for col in df.columns)
+        conn.execute(f'CREATE TABLE "{table_name}" ({columns})')
+    else:
+        # A newer export may carry extra columns
+        for col in df.columns:
+            if col not in existing:
+                conn.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{col}" {sql_type(df[col])}')
+    if index:
+        # IF NOT EXISTS: also restores the index after a full load dropped it
+        create_partition_index(conn, table_name, keys)
+
+
+def _with_keys(df, keys):
+    df = df.drop(columns=[key for key in keys if key in df.columns])
+    for position, (key, value) in enumerate(keys.items()):
+        df.insert(position, key, value)
+    return df
+
+
+def write_partition(conn, table_name, df, team, season, bulk=False):
+    # Replace one (Team, Season) slice of a partitioned table. In bulk mode the
+    # table was emptied up front, so there is nothing to delete and no index to maintain.
+    keys = {"Season": season} if team is None else {"Team": team, "Season": season}
+    df = _with_keys(df, keys)
+
+    ensure_partitioned_table(conn, table_name, df, list(keys), index=not bulk)
+    if not bulk:
+        where = " AND ".join(f'"{key}" = ?' for key in keys)
+        conn.execute(f'DELETE FROM "{table_name}" WHERE {where}', tuple(keys.values()))
+
+    columns = ", ".join(f'"{col}"' for col in df.columns)
+    placeholders = ", ".join("?" for _ in df.columns)
+    conn.executemany(f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders})', _rows(df))
+
+
+def append_partition(conn, table_name, df, team, season):
+    # Add rows to a (Team, Season) slice without touching the rows already there.
+    # Rows are upserted on (Team, Season, Date, Player), so a batch that is
+    # delivered twice or corrects an earlier game never duplicates a row.
+    df = _with_keys(df, {"Team": team, "Season": season})
+    ensure_partitioned_table(conn, table_name, df, ["Team", "Season"])
+    key_list = ", ".join(f'"{key}"' for key in ["Team", "Season"] + GAME_KEYS)
+    conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "idx_{table_name}_game" ON "{table_name}" ({key_list})')
+
+    columns = ", ".join(f'"{col}"' for col in df.columns)
+    placeholders = ", ".join("?" for _ in df.columns)
+    conn.executemany(f'INSERT OR REPLACE INTO "{table_name}" ({columns}) VALUES ({placeholders})', _rows(df))
+
+
+def ensure_meta_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_log (
+            file TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            team TEXT,
+            season INTEGER,
+            sha256 TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            ingested_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS db_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    # Game-log files whose games a later season export already counts. Kept
+    # across full loads so re-reading an old log never counts a game twice.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS covered_game_logs (
+            file TEXT PRIMARY KEY,
+            team TEXT NOT NULL,
+            season INTEGER NOT NULL
+        )
+    """)
+
+
+SCHEMA_VERSION = "7"
+
+# Scoring columns from the standard table that are joined onto the advanced stats
+SKATER_SCORING_COLUMNS = ["G", "A", "PIM", "+/-"]
+# Counting stats summed over a player's game-log rows (whichever the logs carry)
+GAME_TOTAL_COLUMNS = ["G", "A", "PTS", "+/-", "PIM"]
+
+
+def materialize_game_totals(conn, partitions):
+    # Totals per (Team, Season, Player) of the games logged since the season
+    # export: GP is the number of games logged, the counting stats are summed.
+    # materialize_skater_stats and the app's standard frame add them to the export.
+    game_columns = {row[1] for row in conn.execute('PRAGMA table_info("skater_games")')}
+    summed = [col for col in GAME_TOTAL_COLUMNS if col in game_columns]
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS skater_game_totals (
+            "Team" TEXT NOT NULL,
+            "Season" INTEGER NOT NULL,
+            "Player" TEXT NOT NULL,
+            "Pos" TEXT,
+            "GP" INTEGER,
+            {", ".join(f'"{col}" INTEGER' for col in GAME_TOTAL_COLUMNS)},
+            PRIMARY KEY ("Team", "Season", "Player")
+        )
+    """)
+    # A blank cell in a logged game counts as 0; PTS is G + A when the log has no PTS column
+    sums = {col: f'SUM(COALESCE(CAST("{col}" AS INTEGER), 0))' for col in summed}
+    if "PTS" not in sums and {"G", "A"} <= set(sums):
+        summed.append("PTS")
+        sums["PTS"] = f'{sums["G"]} + {sums["A"]}'
+    pos = 'MAX("Pos")' if "Pos" in game_columns else "NULL"
+    sums = ", ".join(sums[col] for col in summed)
+    for team, season in sorted(partitions):
+        conn.execute('DELETE FROM skater_game_totals WHERE "Team" = ? AND "Season" = ?', (team, season))
+        conn.execute(f"""
+            INSERT INTO skater_game_totals ("Team", "Season", "Player", "Pos", "GP"{"".join(f', "{col}"' for col in summed)})
+            SELECT "Team", "Season", "Player", {pos}, COUNT(DISTINCT "Date"){f", {sums}" if sums else ""}
+            FROM skater_games WHERE "Team" = ? AND "Season" = ? AND "Player" IS NOT NULL
+            GROUP BY "Team", "Season", "Player"
+        """, (team, season))
+    return len(partitions)
+
+
+def materialize_skater_stats(conn, partitions):
+    # One row per (Team, Season, Player) with the advanced stats and the scoring
+    # columns already joined and cast, so the app can filter and project in SQL.
+    # Only the partitions that were just ingested are rebuilt.
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if not partitions or not {"skater_advanced", "skater_standard"} <= tables:
+        return 0
+
+    advanced_info = conn.execute('PRAGMA table_info("skater_advanced")').fetchall()
+    advanced_columns = [
+        (name, col_type or "TEXT") for _, name, col_type, *_ in advanced_info
+        if name not in SKATER_SCORING_COLUMNS and name not in ("Team", "Season")
+    ]
+    definitions = ", ".join(f'"{name}" {col_type}' for name, col_type in advanced_columns)
+    scoring = ", ".join(f'"{name}" INTEGER' for name in SKATER_SCORING_COLUMNS)
+    # "Export GP" stays the export's games played after logged games are added
+    # to GP: the export-only columns (CF, CA, SAtt., ice times) cover those games
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS skater_stats (
+            "Team" TEXT NOT NULL,
+            "Season" INTEGER NOT NULL,
+            {definitions},
+            {scoring},
+            "Export GP" INTEGER,
+            PRIMARY KEY ("Team", "Season", "Player")
+        )
+    """)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_skater_stats_gp ON skater_stats ("Team", "Season", "GP")')
+
+    insert_columns = ", ".join(f'"{name}"' for name, _ in advanced_columns + [(c, None) for c in SKATER_SCORING_COLUMNS + ["Export GP"]])
+    select_columns = ", ".join(
+        [f'CAST(a."{name}" AS {col_type})' for name, col_type in advanced_columns]
+        + [f'CAST(s."{name}" AS INTEGER)' for name in SKATER_SCORING_COLUMNS]
+        + ['CAST(a."GP" AS INTEGER)']
+    )
+    for team, season in sorted(partitions):
+        conn.execute('DELETE FROM skater_stats WHERE "Team" = ? AND "Season" = ?', (team, season))
+        conn.execute(f"""
+            INSERT OR REPLACE INTO skater_stats ("Team", "Season", {insert_columns})
+            SELECT a."Team", a."Season", {select_columns}
+            FROM skater_advanced AS a
+            LEFT JOIN skater_standard AS s
+                ON s."Team" = a."Team" AND s."Season" = a."Season" AND s."Player" = a."Player"
+            WHERE a."Team" = ? AND a."Season" = ? AND a."Player" IS NOT NULL
+        """, (team, season))
+        if "skater_game_totals" in tables:
+            apply_game_totals(conn, team, season)
+    return len(partitions)
+
+
+def apply_game_totals(conn, team, season):
+    # Games logged since the season export are added to its GP and scoring
+    # columns. Players who only appear in the game log (call-ups) wait for the
+    # next export: it has the possession numbers every tab reads.
+    assignments = ", ".join(
+        f'"{col}" = COALESCE(skater_stats."{col}", 0) + COALESCE(t."{col}", 0)' for col in ["GP", *SKATER_SCORING_COLUMNS]
+    )
+    conn.execute(f"""
+        UPDATE skater_stats SET {assignments}
+        FROM skater_game_totals AS t
+        WHERE skater_stats."Team" = ? AND skater_stats."Season" = ?
+            AND t."Team" = skater_stats."Team" AND t."Season" = skater_stats."Season" AND t."Player" = skater_stats."Player"
+    """, (team, season))
 
-# Connect to or create the SQLite database
-conn = sqlite3.connect(DB_NAME)
 
-# Loop through all CSVs in the folder
-for filename in os.listdir(CSV_FOLDER):
-    if filename.endswith(".csv"):
-        table_name = filename.replace(".csv", "").lower().replace("-", "_")
-        file_path = os.path.join(CSV_FOLDER, filename)
+def toi_minutes(values):
+    # "12:56" -> 12.93
+    parts = values.astype("string").str.extract(r"^(\d+):(\d{2})$").astype(float)
+    return parts[0] + parts[1] / 60
 
+
+def player_feature_frame(skaters):
+    # One vector per skater: raw rate, z-score and percentile rank against every
+    # skater in the league for the same season
+    df = skaters[skaters["GP"] >= FEATURE_MIN_GP]
+    gp = df["GP"].astype(float)
+    export_gp = df["Export GP"].astype(float)   # games the possession columns cover
+    rates = pd.DataFrame({
+        "CF%": df["CF%"],
+        "FF%": df["FF%"],
+        "CF% rel": df["CF% rel"],
+        "CF/GP": df["CF"] / export_gp,
+        "CA/GP": df["CA"] / export_gp,
+        "oZS%": df["oZS%"],
+        "TOI/60": toi_minutes(df["TOI/60"]),
+        "TOI(EV)": toi_minutes(df["TOI(EV)"]),
+        "G/GP": df["G"] / gp,
+        "A/GP": df["A"] / gp,
+        "PTS/GP": (df["G"] + df["A"]) / gp,
+        "SAtt./GP": df["SAtt."] / export_gp,
+    }, index=df.index).astype(float)
+
+    # A missing stat gets the league mean so it is neutral rather than an outlier
+    by_season = rates.groupby(df["Season"])
+    rates = rates.fillna(by_season.transform("mean")).fillna(0)
+    by_season = rates.groupby(df["Season"])
+    std = by_season.transform("std", ddof=0).replace(0, 1).fillna(1)
+    z = (rates - by_season.transform("mean")) / std
+    pct = by_season.rank(pct=True) * 100
+
+    features = df[["Team", "Season", "Player", "Pos", "GP"]].copy()
+    for name in PLAYER_FEATURES:
+        features[name] = rates[name].round(3)
+        features[f"{name} z"] = z[name]
+        features[f"{name} pct"] = pct[name].round(1)
+    return features.reset_index(drop=True)
+
+
+def materialize_player_features(conn, seasons):
+    # Standardizing needs the whole league, so every touched season is rebuilt
+    # from skater_stats as a whole
+    for season in sorted(seasons):
+        skaters = pd.read_sql('SELECT * FROM skater_stats WHERE "Season" = ?', conn, params=[season])
+        features = player_feature_frame(skaters)
+        write_partition(conn, "player_features", features, None, season)
+    return len(seasons)
+
+
+# Derived per-player metrics, computed once per partition at ingest so the tabs
+# only read columns. Ice times are parsed from "m:ss" here, so the per-60 rates
+# are over real time on ice: CF60 = CF per 60 minutes of even-strength TOI.
+
+
+def per_60(values, minutes):
+    return (values / minutes.where(minutes > 0) * 60).round(2)
+
+
+def share(values):
+    return (values / values.sum() * 100).round(2)
+
+
+def derive_skater_metrics(skaters):
+    # One team/season of skater_stats. TOI(EV) is per game and, like the
+    # CF/CA/FF/FA even-strength totals, comes from the season export alone, so
+    # the per-60 rates are over the export's games; PTS and GP include the games
+    # logged since. Shares are of the total of the skaters in the Skater tab's
+    # pool (SKATER_TAB_MIN_GP games or more); the rest have none.
+    skaters = skaters[skaters["Player"].notna()]
+    gp = skaters["GP"].astype(float)
+    pool = gp >= SKATER_TAB_MIN_GP
+    ev_minutes = toi_minutes(skaters["TOI(EV)"]) * skaters["Export GP"].astype(float)
+    pts = (skaters["G"] + skaters["A"]).astype("Int64")
+    return pd.DataFrame({
+        "Player": skaters["Player"],
+        "PTS": pts,
+        "PTS_per_GP": (pts.astype(float) / gp).round(3),
+        "EV TOI min": ev_minutes.round(1),
+        "CF60": per_60(skaters["CF"], ev_minutes),
+        "CA60": per_60(skaters["CA"], ev_minutes),
+        "FF60": per_60(skaters["FF"], ev_minutes),
+        "FA60": per_60(skaters["FA"], ev_minutes),
+        "CF_%": share(skaters["CF"].where(pool)),
+        "FF_%": share(skaters["FF"].where(pool)),
+    }).reset_index(drop=True)
+
+
+def derive_goalie_metrics(goalies):
+    # One team/season of goalie_stats; MIN is total time in net ("1455:11")
+    goalies = goalies[goalies["Player"].notna()]
+    minutes = toi_minutes(goalies["MIN"])
+    return pd.DataFrame({
+        "Player": goalies["Player"],
+        "TOI min": minutes.round(1),
+        "GA60": per_60(goalies["GA"], minutes),
+        "SA60": per_60(goalies["Shots"], minutes),
+        "SV60": per_60(goalies["SV"], minutes),
+        "GSAA60": per_60(goalies["GSAA"], minutes),
+        "TOI_%": share(minutes),
+    }).reset_index(drop=True)
+
+
+def materialize_derived_metrics(conn, skater_partitions, goalie_partitions):
+    # skater_metrics / goalie_metrics, one row per (Team, Season, Player). The
+    # app joins them onto skater_stats / goalie_stats on those keys.
+    for table, source, derive, partitions in [
+        ("skater_metrics", "skater_stats", derive_skater_metrics, skater_partitions),
+        ("goalie_metrics", "goalie_stats", derive_goalie_metrics, goalie_partitions),
+    ]:
+        for team, season in sorted(partitions):
+            rows = pd.read_sql(f'SELECT * FROM "{source}" WHERE "Team" = ? AND "Season" = ?', conn, params=[team, season])
+            write_partition(conn, table, derive(rows), team, season)
+        if partitions:
+            conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "idx_{table}_player" ON "{table}" ("Team", "Season", "Player")')
+    return len(skater_partitions | goalie_partitions)
+
+
+# Team Summary rollup: skater totals and averages per team, season and position
+ROLLUP_TOTALS = ["G", "A"]
+ROLLUP_MEANS = ["CF", "CA", "oZS%", "dZS%"]
+ROLLUP_ALL = "ALL"   # Pos value of the whole-roster row
+# League benchmarks: spread of each team-level stat across the league
+LEAGUE_PERCENTILES = [10, 25, 50, 75, 90]
+
+
+def materialize_team_rollup(conn, partitions):
+    # One row per position plus an ALL row for each touched (Team, Season),
+    # aggregated in SQLite straight from skater_stats
+    totals = ", ".join(f'SUM("{col}") AS "{col}"' for col in ROLLUP_TOTALS)
+    means = ", ".join(f'AVG("{col}") AS "{col} avg"' for col in ROLLUP_MEANS)
+    aggregates = f'COUNT(*) AS "Skaters", {totals}, SUM("G") + SUM("A") AS "PTS", {means}'
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS team_rollup (
+            "Team" TEXT NOT NULL,
+            "Season" INTEGER NOT NULL,
+            "Pos" TEXT NOT NULL,
+            "Skaters" INTEGER,
+            {", ".join(f'"{col}" INTEGER' for col in ROLLUP_TOTALS)},
+            "PTS" INTEGER,
+            {", ".join(f'"{col} avg" REAL' for col in ROLLUP_MEANS)},
+            PRIMARY KEY ("Team", "Season", "Pos")
+        )
+    """)
+    for team, season in sorted(partitions):
+        conn.execute('DELETE FROM team_rollup WHERE "Team" = ? AND "Season" = ?', (team, season))
+        conn.execute(f"""
+            INSERT INTO team_rollup
+            SELECT "Team", "Season", COALESCE("Pos", '?'), {aggregates}
+            FROM skater_stats WHERE "Team" = ? AND "Season" = ? GROUP BY COALESCE("Pos", '?')
+            UNION ALL
+            SELECT "Team", "Season", '{ROLLUP_ALL}', {aggregates}
+            FROM skater_stats WHERE "Team" = ? AND "Season" = ? GROUP BY "Team", "Season"
+        """, (team, season, team, season))
+    return len(partitions)
+
+
+def league_benchmark_frame(frames):
+    # Mean and percentiles of every numeric column, one row per (Source, Stat)
+    rows = []
+    for source, df in frames.items():
+        numeric = df.drop(columns=["Season", "Rk"], errors="ignore").select_dtypes("number")
+        for stat in numeric.columns:
+            values = numeric[stat].dropna()
+            if values.empty:
+                continue
+            row = {"Source": source, "Stat": stat, "Teams": len(values), "mean": values.mean()}
+            row.update({f"p{q}": values.quantile(q / 100) for q in LEAGUE_PERCENTILES})
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def materialize_league_rollup(conn, seasons):
+    # Rebuilt per touched season: league team tables (without the League
+    # Average row) plus the whole-roster rows of team_rollup
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for season in sorted(seasons):
+        frames = {}
+        for table in [*LEAGUE_TABLES.values(), "team_rollup"]:
+            if table not in tables:
+                continue
+            df = pd.read_sql(f'SELECT * FROM "{table}" WHERE "Season" = ?', conn, params=[season])
+            if "Rk" in df.columns:
+                df = df[df["Rk"].notna()]
+            if table == "team_rollup":
+                df = df[df["Pos"] == ROLLUP_ALL]
+            frames[table] = df
+        benchmarks = league_benchmark_frame(frames)
+        if not benchmarks.empty:
+            write_partition(conn, "league_rollup", benchmarks, None, season)
+    return len(seasons)
+
+
+def materialize_shot_bins(conn, partitions, store):
+    # Density pyramid for every touched (Team, Season), re-binned from all of
+    # the partition's parts in the columnar store
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS shot_bins (
+            "Team" TEXT NOT NULL,
+            "Season" INTEGER NOT NULL,
+            "Player" TEXT NOT NULL,
+            "Layer" TEXT NOT NULL,
+            "Level" INTEGER NOT NULL,
+            "BinFt" INTEGER NOT NULL,
+            "Rows" INTEGER NOT NULL,
+            "Cols" INTEGER NOT NULL,
+            "Shots" INTEGER NOT NULL,
+            "Counts" BLOB NOT NULL,
+            PRIMARY KEY ("Team", "Season", "Player", "Layer", "Level")
+        )
+    """)
+    for team, season in sorted(partitions):
+        conn.execute('DELETE FROM shot_bins WHERE "Team" = ? AND "Season" = ?', (team, season))
+        events, players = shots.read_partition(store, team, season)
+        conn.executemany(
+            "INSERT INTO shot_bins VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (team, season, player, layer, level, bin_ft, *grid.shape, int(grid.sum()), shots.encode(grid))
+                for player, layer, level, bin_ft, grid in shots.density_grids(events, players)
+            ),
+        )
+    return len(partitions)
+
+
+def check_schema(conn):
+    # Databases built before the partitioned layout are rebuilt from scratch
+    row = conn.execute("SELECT value FROM db_meta WHERE key = 'schema_version'").fetchone()
+    if row and row[0] == SCHEMA_VERSION:
+        return False
+    print(f"Rebuilding database for schema version {SCHEMA_VERSION}")
+    version = read_data_version(conn)
+    conn.execute("BEGIN")
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    for table in tables:
+        if table == "covered_game_logs":
+            continue   # still true of the files on disk
+        conn.execute(f'DROP TABLE "{table}"')
+    ensure_meta_tables(conn)
+    # Keep the data version moving forward so app caches never reuse an old stamp
+    conn.execute("INSERT INTO db_meta (key, value) VALUES ('data_version', ?)", (str(version),))
+    conn.execute("INSERT INTO db_meta (key, value) VALUES ('schema_version', ?)", (SCHEMA_VERSION,))
+    write_generation(conn)
+    conn.execute("COMMIT")
+    return True
+
+
+def write_generation(conn):
+    # A random id per ingest. Unlike the data_version counter it never repeats
+    # across rebuilt or different databases, so stamps made from it (app caches,
+    # report bundles) can't match data they weren't built from.
+    conn.execute("INSERT OR REPLACE INTO db_meta (key, value) VALUES ('generation', ?)", (uuid.uuid4().hex,))
+
+
+def read_data_version(conn):
+    row = conn.execute("SELECT value FROM db_meta WHERE key = 'data_version'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def changed_files(conn, folder, full=False):
+    known = dict(conn.execute("SELECT file, sha256 FROM ingest_log").fetchall())
+    changed = []
+    for filename in sorted(os.listdir(folder)):
+        if not filename.endswith(".csv"):
+            continue
+        digest = file_hash(os.path.join(folder, filename))
+        if full or known.get(filename) != digest:
+            changed.append((filename, digest))
+    return changed
+
+
+def cover_game_logs(conn, logged, team, season):
+    # A new or changed season export already counts the games logged before
+    # this ingest: record those game-log files as covered and drop their rows.
+    # Returns how many files it covered.
+    files = [
+        (file, team, season) for file, (table_name, *partition, _) in logged.items()
+        if table_name in APPEND_TABLES.values() and partition == [team, season]
+    ]
+    conn.executemany("INSERT OR IGNORE INTO covered_game_logs (file, team, season) VALUES (?, ?, ?)", files)
+    if files:
+        for table_name in APPEND_TABLES.values():
+            conn.execute(f'DELETE FROM "{table_name}" WHERE "Team" = ? AND "Season" = ?', (team, season))
+    return len(files)
+
+
+def clear_for_full_load(conn):
+    # A full load rewrites every table from scratch: empty them and drop the
+    # partition indexes so the inserts don't maintain them row by row
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    rebuilt = set(TEAM_TABLES.values()) | set(LEAGUE_TABLES.values()) | set(APPEND_TABLES.values()) | {"skater_stats", "skater_game_totals", "player_features", "team_rollup", "league_rollup", "shot_bins", "skater_metrics", "goalie_metrics"}
+    for table in sorted(tables & rebuilt):
+        conn.execute(f'DROP INDEX IF EXISTS "idx_{table}_partition"')
+        conn.execute(f'DELETE FROM "{table}"')
+    conn.execute("DELETE FROM ingest_log")
+
+
+def report_throughput(rows, nbytes, parse_s, write_s):
+    mb = nbytes / 1e6
+    parse_s, write_s = max(parse_s, 1e-6), max(write_s, 1e-6)
+    total_s = parse_s + write_s
+    print(f"📈 {rows:,} rows, {mb:.1f} MB: parse {parse_s:.2f}s ({rows / parse_s:,.0f} rows/s, {mb / parse_s:.1f} MB/s), "
+          f"write {write_s:.2f}s ({rows / write_s:,.0f} rows/s), total {rows / total_s:,.0f} rows/s")
+
+
+def build(db_name=DB_NAME, folder=CSV_FOLDER, full=False, workers=None):
+    # isolation_level=None lets us manage a single explicit transaction for the whole ingest
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    try:
+        # WAL lets the app's read-only connections keep reading while an ingest writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        ensure_meta_tables(conn)
+        full = check_schema(conn) or full
+        if conn.execute("SELECT 1 FROM db_meta WHERE key = 'generation'").fetchone() is None:
+            write_generation(conn)   # databases built before generation ids existed
+        changed = changed_files(conn, folder, full)
+        if not changed:
+            print(f"✅ '{db_name}' is up to date (data version {read_data_version(conn)}).")
+            return read_data_version(conn)
+
+        # Parse everything before opening the write transaction so a bad file
+        # leaves the database untouched
+        start = time.perf_counter()
+        parsed = []
+        for filename, digest, df, error in parse_files(folder, changed, workers):
+            if error is None:
+                parsed.append((filename, digest, df))
+            else:
+                print(f"❌ Failed to import '{filename}': {error}")
+        parse_s = time.perf_counter() - start
+
+        if not parsed:
+            return read_data_version(conn)
+        # Season exports first: one in this batch covers the games logged
+        # before it, but not game logs that arrive alongside it
+        parsed.sort(key=lambda item: partition_for(item[0])[0] in APPEND_TABLES.values())
+        logged = {
+            file: (table_name, team, season, sha256)
+            for file, table_name, team, season, sha256 in conn.execute("SELECT file, table_name, team, season, sha256 FROM ingest_log")
+        }
+
+        # This process is the only writer: one transaction for the whole batch.
+        # The shot store lives outside it. Incrementally, a part is only ever
+        # replaced by a re-ingest of the same file, so a rolled-back batch just
+        # redoes it. A full build writes a new store to a staging directory that
+        # replaces the live one only after COMMIT: a failed build keeps the old
+        # store, which still matches the old ingest_log.
+        start = time.perf_counter()
+        live_store = shots.store_dir(db_name)
+        store = shots.staging_dir(live_store) if full else live_store
+        conn.execute("BEGIN")
         try:
-            df = pd.read_csv(file_path)
-            df.to_sql(table_name, conn, if_exists="replace", index=False)
-            print(f"✅ Imported '{filename}' as table '{table_name}'")
-        except Exception as e:
-            print(f"❌ Failed to import '{filename}': {e}")
+            if full:
+                clear_for_full_load(conn)
+                shots.clear_store(store)
+            stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+            skater_partitions = set()
+            league_seasons = set()
+            shot_partitions = set()
+            goalie_partitions = set()
+            game_partitions = set()
+            deferred_indexes = {}
+            for filename, digest, df in parsed:
+                table_name, team, season = partition_for(filename)
+                if season is None:
+                    write_table(conn, table_name, df)
+                    print(f"✅ Imported '{filename}' as table '{table_name}'")
+                elif table_name in APPEND_TABLES.values():
+                    if conn.execute("SELECT 1 FROM covered_game_logs WHERE file = ?", (filename,)).fetchone():
+                        print(f"⏭️ Skipped '{filename}': its games are in the season export")
+                    else:
+                        append_partition(conn, table_name, df, team, season)
+                    game_partitions.add((team, season))
+                    skater_partitions.add((team, season))
+                    print(f"✅ Appended {len(df)} row(s) from '{filename}' to '{table_name}' ({team}, {season})")
+                elif table_name in EVENT_STORES.values():
+                    shots.write_part(store, team, season, table_name_for(filename), df)
+                    shot_partitions.add((team, season))
+                    print(f"✅ Stored {len(df)} shot event(s) from '{filename}' ({team}, {season})")
+                else:
+                    write_partition(conn, table_name, df, team, season, bulk=full)
+                    print(f"✅ Imported '{filename}' into '{table_name}' ({team or 'league'}, {season})")
+                    deferred_indexes[table_name] = ["Season"] if team is None else ["Team", "Season"]
+                    if table_name in ("skater_advanced", "skater_standard"):
+                        skater_partitions.add((team, season))
+                        refreshed = filename not in logged or logged[filename][3] != digest
+                        if refreshed and cover_game_logs(conn, logged, team, season):
+                            game_partitions.add((team, season))
+                    elif table_name == "goalie_stats":
+                        goalie_partitions.add((team, season))
+                    elif table_name in LEAGUE_TABLES.values():
+                        league_seasons.add(season)
+                conn.execute(
+                    "INSERT OR REPLACE INTO ingest_log (file, table_name, team, season, sha256, rows, ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (filename, table_name, team, season, digest, len(df), stamp),
+                )
+
+            if full:
+                # Build each partition index once, after all the rows are in
+                for table_name, keys in deferred_indexes.items():
+                    create_partition_index(conn, table_name, keys)
+
+            if game_partitions:
+                partitions = materialize_game_totals(conn, game_partitions)
+                print(f"✅ Materialized 'skater_game_totals' for {partitions} team/season partition(s)")
+            if skater_partitions:
+                # Appended game rows go through the same stages as a replaced export
+                partitions = materialize_skater_stats(conn, skater_partitions)
+                print(f"✅ Materialized 'skater_stats' for {partitions} team/season partition(s)")
+                seasons = materialize_player_features(conn, {season for _, season in skater_partitions})
+                print(f"✅ Materialized 'player_features' for {seasons} season(s)")
+                partitions = materialize_team_rollup(conn, skater_partitions)
+                print(f"✅ Materialized 'team_rollup' for {partitions} team/season partition(s)")
+                league_seasons |= {season for _, season in skater_partitions}
+            if skater_partitions or goalie_partitions:
+                partitions = materialize_derived_metrics(conn, skater_partitions, goalie_partitions)
+                print(f"✅ Materialized 'skater_metrics'/'goalie_metrics' for {partitions} team/season partition(s)")
+            if league_seasons:
+                seasons = materialize_league_rollup(conn, league_seasons)
+                print(f"✅ Materialized 'league_rollup' for {seasons} season(s)")
+            if shot_partitions:
+                partitions = materialize_shot_bins(conn, shot_partitions, store)
+                print(f"✅ Materialized 'shot_bins' for {partitions} team/season partition(s)")
+
+            version = read_data_version(conn) + 1
+            conn.execute("INSERT OR REPLACE INTO db_meta (key, value) VALUES ('data_version', ?)", (str(version),))
+            write_generation(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            if full:
+                shots.clear_store(store)
+            raise
+        if full:
+            shots.swap_store(store, live_store)
+        write_s = time.perf_counter() - start
+    finally:
+        # Close DB connection
+        conn.close()
+
+    print(f"\n✅ {len(parsed)} changed CSV(s) added to '{db_name}' (data version {version}).")
+    nbytes = sum(os.path.getsize(os.path.join(folder, filename)) for filename, _, _ in parsed)
+    report_throughput(sum(len(df) for _, _, df in parsed), nbytes, parse_s, write_s)
+    return version
+
+
+def folder_snapshot(folder):
+    # Cheap change check for watch mode; files are only hashed once this moves
+    return {
+        entry.name: (entry.stat().st_mtime_ns, entry.stat().st_size)
+        for entry in os.scandir(folder) if entry.name.endswith(".csv")
+    }
+
+
+def watch(db_name=DB_NAME, folder=CSV_FOLDER, interval=5.0, workers=None):
+    # Ingest new or changed CSVs as they land. Each ingest bumps data_version,
+    # which the running app polls, so open dashboards pick the rows up within seconds.
+    print(f"👀 Watching '{folder}' every {interval:g}s (Ctrl+C to stop)")
+    seen = None
+    try:
+        while True:
+            snapshot = folder_snapshot(folder)
+            if snapshot != seen:
+                build(db_name, folder, workers=workers)
+                seen = snapshot
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
 
-# Close DB connection
-conn.close()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the stats CSVs into the SQLite database.")
+    parser.add_argument("--full", action="store_true", help="re-import every CSV even if it has not changed")
+    parser.add_argument("--watch", action="store_true", help="keep running and ingest CSVs as they are added or changed")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between folder checks in --watch mode")
+    parser.add_argument("--workers", type=int, help="parser processes (default: one per CPU, 1 disables the pool)")
+    args = parser.parse_args()
 
-print(f"\n✅ All CSVs added to '{DB_NAME}' successfully.")
+    start = time.perf_counter()
+    build(full=args.full, workers=args.workers)
+    print(f"Finished in {(time.perf_counter() - start) * 1000:.1f} ms")
+    if args.watch:
+        watch(interval=args.interval, workers=args.workers)
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import metrics
+
+# Role clustering for the Skater tab. Fitted models are cached in memory and
+# pickled to MODEL_DIR keyed on a hash of the input rows, so reruns (and new
+# processes) only refit when the underlying data changes.
+
+MODEL_DIR = "model_cache"
+ROLE_FEATURES = ["CF", "CA", "oZS%", "dZS%"]
+MINI_BATCH_THRESHOLD = 5000   # switch to MiniBatchKMeans for league-wide, multi-season pools
+SILHOUETTE_SAMPLE = 5000      # silhouette is O(n^2), so score a sample on large pools
+
+# Background worker for k sweeps so the page never waits on them
+_sweep_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def features_hash(X):
+    hashed = pd.util.hash_pandas_object(X.reset_index(drop=True), index=False).values
+    return hashlib.sha256(hashed.tobytes() + ",".join(X.columns).encode()).hexdigest()[:16]
+
+
+def _make_model(n_clusters, n_rows):
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    if n_rows >= MINI_BATCH_THRESHOLD:
+        return MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3, batch_size=1024)
+    return KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+
+
+def _fit(X, n_clusters):
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+    model = _make_model(n_clusters, len(X))
+    labels = model.fit_predict(X_scaled)
+    return {"scaler": scaler, "model": model, "labels": labels}
+
+
+@st.cache_resource(max_entries=16)
+def _fitted_roles(key, _X, n_clusters):
+    metrics.cache_miss("role_model")
+    path = os.path.join(MODEL_DIR, f"roles_{key}_k{n_clusters}.pkl")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    with metrics.span("kmeans.fit"):
+        fitted = _fit(_X, n_clusters)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    # Write to a temp file first so a concurrent reader never sees a partial pickle
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(fitted, f)
+    os.replace(tmp_path, path)
+    return fitted
+
+
+def fit_roles(X, n_clusters=4):
+    # Returns one cluster label per row of X
+    metrics.cache_call("role_model")
+    return _fitted_roles(features_hash(X), X, n_clusters)["labels"]
+
+
+def _silhouette_for_k(X_scaled, k):
+    from sklearn.metrics import silhouette_score
+
+    labels = _make_model(k, len(X_scaled)).fit_predict(X_scaled)
+    sample = min(len(X_scaled), SILHOUETTE_SAMPLE)
+    return k, silhouette_score(X_scaled, labels, sample_size=sample, random_state=42)
+
+
+@metrics.timed("kmeans.k_sweep")
+def _sweep(X, k_values):
+    from sklearn.preprocessing import StandardScaler
+
+    X_scaled = StandardScaler().fit_transform(X)
+    # KMeans spends most of its time in native code, so threads run the fits in parallel
+    with ThreadPoolExecutor(max_workers=max(1, min(len(k_values), os.cpu_count() or 1))) as pool:
+        scores = list(pool.map(lambda k: _silhouette_for_k(X_scaled, k), k_values))
+    return pd.DataFrame(scores, columns=["k", "Silhouette"])
+
+
+@st.cache_resource(max_entries=4)
+def _sweep_future(key, _X, k_values):
+    return _sweep_executor.submit(_sweep, _X.copy(), list(k_values))
+
+
+def start_k_sweep(X, k_values=range(2, 9)):
+    # Valid k values need at least one more row than clusters
+    k_values = tuple(k for k in k_values if k < len(X))
+    return _sweep_future(features_hash(X), X, k_values)
+
+
+def best_k(scores):
+    return int(scores.loc[np.argmax(scores["Silhouette"].to_numpy()), "k"])
@@ -0,0 +1,439 @@
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import pandas as pd
+import streamlit as st
+
+import metrics
+import shots
+
+# Shared data access for the dashboard, map.py and rink_map.py.
+# Every table is read once per data version and (team, season) partition and
+# the same frames are handed to every tab instead of each tab re-reading the CSVs.
+
+DB_PATH = "nhl_data.db"
+DEFAULT_TEAM = "flyers"
+DEFAULT_SEASON = 2024
+TEAM_NAMES = {"flyers": "Philadelphia Flyers"}
+VERSION_TTL_S = 2      # how stale data_version() may be
+VERSION_POLL_S = 5     # how often open pages check for a new data version
+POOL_SIZE = 5          # idle read-only connections kept per database, and parallel table reads
+
+
+# Categoricals store each distinct string once per frame instead of per row
+CATEGORY_COLUMNS = ["Player", "Pos", "Team"]
+# "m:ss" ice times (per game, or season totals like "1507:52") become integer seconds
+TIME_COLUMNS = ["TOI", "ATOI", "TOI/60", "TOI(EV)", "MIN"]
+
+
+def toi_seconds(values):
+    parts = values.astype("string").str.extract(r"^(\d+):(\d{2})$").astype("Int64")
+    seconds = parts[0] * 60 + parts[1]
+    return seconds.astype("int32") if not seconds.hasnans else seconds.astype("Int32")
+
+
+def compact(df):
+    # Smallest faithful dtypes for a frame that is cached once and shared by
+    # every session. Integers stop at int32: int8/int16 would overflow derived
+    # columns like G + A. Floats stay float64 since float32 shows rounding noise
+    # (0.908 -> 0.9079999...) in the tables.
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        if col in CATEGORY_COLUMNS:
+            values = values.astype("category")
+        elif col in TIME_COLUMNS:
+            values = toi_seconds(values)
+        elif pd.api.types.is_integer_dtype(values):
+            values = values.astype("int32") if values.between(-2**31, 2**31 - 1).all() else values
+        out[col] = values
+    return pd.DataFrame(out, index=df.index)
+
+
+# Read-only connection pool.
+# The app never writes, so it borrows mode=ro connections instead of opening
+# one per query. build_db.py keeps the database in WAL mode, so these readers
+# don't block (or get blocked by) an ingest running next to the app. The pool
+# is keyed on the file's inode as well as its path: a database replaced on
+# disk gets fresh connections instead of ones still reading the old file.
+_pools = {}   # (path, inode) -> idle connections
+_pools_lock = threading.Lock()
+_readers = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="sqlite-read")
+# One background thread for prefetch(); separate from _readers so a prefetch
+# waiting on its table reads can never starve them of workers
+_prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+_prefetched = set()
+# The cached functions warn about the missing script context on every call
+# from the prefetch thread; that thread never draws anything, so drop those
+logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+    lambda record: not record.threadName.startswith("prefetch")
+)
+
+
+def _pool_key(db_path):
+    try:
+        return db_path, os.stat(db_path).st_ino
+    except OSError:
+        return db_path, None
+
+
+@contextmanager
+def connection(db_path=None):
+    # Borrow a pooled read-only connection; safe to use from any one thread at a time
+    key = _pool_key(db_path or DB_PATH)
+    with _pools_lock:
+        for stale in [k for k in _pools if k[0] == key[0] and k != key]:
+            for conn in _pools.pop(stale):
+                conn.close()
+        idle = _pools.setdefault(key, [])
+        conn = idle.pop() if idle else None
+    if conn is None:
+        metrics.cache_miss("sqlite_pool")
+        conn = sqlite3.connect(f"file:{key[0]}?mode=ro", uri=True, check_same_thread=False)
+    metrics.cache_call("sqlite_pool")
+    try:
+        yield conn
+    finally:
+        with _pools_lock:
+            if _pools.get(key) is idle and len(idle) < POOL_SIZE:
+                idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+@dataclass(frozen=True)
+class Dataset:
+    version: str                   # db_meta.data_version the frames were read at
+    team: str
+    season: int
+    standard: pd.DataFrame         # skater_standard for the team (skaters and goalies)
+    goalies: pd.DataFrame          # goalie_stats with the derived goalie_metrics columns
+    misc: pd.DataFrame
+    team_stats: pd.DataFrame       # team_stats for the season, one row per team plus league average
+    league_advanced: pd.DataFrame  # team_advanced for the season
+
+    def view(self):
+        # The cached frames are shared by every session. Hand out shallow
+        # copies: with copy-on-write a caller adding or changing a column gets
+        # its own data without copying anything up front or touching the shared frames.
+        return Dataset(
+            version=self.version,
+            team=self.team,
+            season=self.season,
+            **{name: getattr(self, name).copy(deep=False) for name in ("standard", "goalies", "misc", "team_stats", "league_advanced")},
+        )
+
+
+@st.cache_data(ttl=VERSION_TTL_S)
+def _data_version(db_path):
+    with connection(db_path) as conn:
+        meta = dict(conn.execute("SELECT key, value FROM db_meta WHERE key IN ('data_version', 'generation')").fetchall())
+    version = meta.get("data_version", "0")
+    return f"{version}-{meta['generation']}" if "generation" in meta else version
+
+
+def data_version():
+    # "<counter>-<generation>". build_db.py bumps the counter and writes a new
+    # random generation id every time it imports changed CSVs. The counter
+    # restarts when a database is rebuilt from scratch, the generation never
+    # repeats, so a rebuilt or swapped-in database can't reuse an old stamp.
+    # Every cache below and report.py's bundles are keyed on it, so new data is
+    # picked up within VERSION_TTL_S without clearing anything, and reruns
+    # don't each open a connection to read it.
+    return _data_version(DB_PATH)
+
+
+@st.fragment(run_every=VERSION_POLL_S)
+def refresh_on_new_data():
+    # Reruns the whole page when an ingest (e.g. build_db.py --watch) lands.
+    # Call it inside `with st.sidebar:`, fragments only draw into their own container.
+    version = data_version()
+    seen = st.session_state.setdefault("seen_data_version", version)
+    st.caption(f"Data version {version}")
+    if version != seen:
+        st.session_state["seen_data_version"] = version
+        st.rerun()
+
+
+def team_label(team):
+    return TEAM_NAMES.get(team, team.replace("_", " ").title())
+
+
+# Per-60 and share columns build_db.py derives at ingest, joined onto their stats table
+DERIVED_TABLES = {"skater_stats": "skater_metrics", "goalie_stats": "goalie_metrics"}
+
+
+def _source(table):
+    if table not in DERIVED_TABLES:
+        return f'"{table}"'
+    return f'"{table}" LEFT JOIN "{DERIVED_TABLES[table]}" USING ("Team", "Season", "Player")'
+
+
+def _read_partition(conn, table, columns=None, **keys):
+    # Tables are partitioned by (Team, Season) and indexed on those keys, so
+    # this only touches the rows for the selected partition
+    where = " AND ".join(f'"{key}" = ?' for key in keys)
+    select = ", ".join(f'"{col}"' for col in [*keys, *columns]) if columns else "*"
+    with metrics.span(f"sqlite.read[{table}]"):
+        df = pd.read_sql(f'SELECT {select} FROM {_source(table)} WHERE {where}', conn, params=list(keys.values()))
+    return compact(df.drop(columns=list(keys)))
+
+
+def _read_table(table, columns=None, **keys):
+    with connection() as conn:
+        return _read_partition(conn, table, columns, **keys)
+
+
+def _read_game_totals(team, season):
+    # skater_game_totals only exists once a game log has been ingested
+    try:
+        return _read_table("skater_game_totals", Team=team, Season=season)
+    except (sqlite3.OperationalError, pd.errors.DatabaseError):
+        return None
+
+
+def _with_game_totals(standard, totals):
+    # Games logged since the season export (build_db.py sums them per player)
+    # are added to the export's GP and counting stats. Call-ups who only appear
+    # in the log wait for the next export, as in skater_stats.
+    if totals is None or totals.empty:
+        return standard
+    totals = totals.assign(Player=totals["Player"].astype(str)).drop_duplicates("Player").set_index("Player")
+    players = standard["Player"].astype(object)
+    out = standard.copy()
+    for col in totals.columns:
+        if col == "Pos" or col not in out.columns:
+            continue
+        added = out[col] + players.map(totals[col]).fillna(0)
+        # Keep integer columns integer when nothing is missing
+        out[col] = added.astype(out[col].dtype) if added.notna().all() else added
+    return out
+
+
+# cache_resource, not cache_data: cache_data pickles the result and hands every
+# caller its own copy, cache_resource keeps one object that all sessions share
+@st.cache_resource(max_entries=8)
+def _load(version, team, season):
+    metrics.cache_miss("load_data")
+    # The tables are independent: read them concurrently, each on its own
+    # pooled connection (sqlite3 releases the GIL while a query runs)
+    reads = {
+        "standard": _readers.submit(_read_table, "skater_standard", Team=team, Season=season),
+        "goalies": _readers.submit(_read_table, "goalie_stats", Team=team, Season=season),
+        "misc": _readers.submit(_read_table, "skater_misc", Team=team, Season=season),
+        "team_stats": _readers.submit(_read_table, "team_stats", Season=season),
+        "league_advanced": _readers.submit(_read_table, "team_advanced", Season=season),
+        "game_totals": _readers.submit(_read_game_totals, team, season),
+    }
+    with metrics.span("load_data.wait"):
+        frames = {name: future.result() for name, future in reads.items()}
+    frames["standard"] = _with_game_totals(frames["standard"], frames.pop("game_totals"))
+    return Dataset(version=version, team=team, season=season, **frames)
+
+
+@st.cache_data(max_entries=2)
+def _partitions(version):
+    with connection() as conn:
+        return conn.execute('SELECT DISTINCT "Team", "Season" FROM skater_stats ORDER BY "Team", "Season"').fetchall()
+
+
+def partitions():
+    # Every (team, season) with skater data
+    return _partitions(data_version())
+
+
+def current_partition():
+    return st.session_state.get("team", DEFAULT_TEAM), st.session_state.get("season", DEFAULT_SEASON)
+
+
+def partition_selector():
+    # Sidebar team/season picker; the choice is kept in st.session_state
+    available = partitions()
+    teams = sorted({team for team, _ in available})
+    if st.session_state.get("team") not in teams:
+        st.session_state["team"] = DEFAULT_TEAM if DEFAULT_TEAM in teams else teams[0]
+    team = st.sidebar.selectbox("Team", teams, key="team", format_func=team_label)
+
+    seasons = sorted({season for t, season in available if t == team}, reverse=True)
+    if st.session_state.get("season") not in seasons:
+        st.session_state["season"] = seasons[0]
+    season = st.sidebar.selectbox("Season", seasons, key="season")
+    return team, season
+
+
+@metrics.timed("load_data")
+def load_data(team=None, season=None):
+    metrics.cache_call("load_data")
+    default_team, default_season = current_partition()
+    return _load(data_version(), team or default_team, season or default_season).view()
+
+
+@st.cache_resource(max_entries=32)
+def _query_skaters(version, columns, team, season, min_gp):
+    metrics.cache_miss("query_skaters")
+    # skater_stats is materialized by build_db.py with the advanced and scoring
+    # columns already joined and cast, and the derived rates alongside in
+    # skater_metrics, so filters and projection run in SQLite. team/season None
+    # reads every partition.
+    select = ", ".join(f'"{col}"' for col in columns) if columns else "*"
+    filters = {'"Team" = ?': team, '"Season" = ?': season, '"GP" >= ?': min_gp}
+    where = " AND ".join(clause for clause, value in filters.items() if value is not None)
+    params = [value for value in filters.values() if value is not None]
+    sql = f'SELECT {select} FROM {_source("skater_stats")}' + (f" WHERE {where}" if where else "")
+    # Call-ups who so far only appear in a game log have no Rk and go last
+    sql += ' ORDER BY "Rk" IS NULL, "Rk"' if team is not None and season is not None else ' ORDER BY "Season", "Team", "Rk" IS NULL, "Rk"'
+
+    with connection() as conn, metrics.span("sqlite.query_skaters"):
+        return compact(pd.read_sql(sql, conn, params=params))
+
+
+@metrics.timed("query_skaters")
+def query_skaters(columns=None, team=None, season=None, min_gp=None):
+    metrics.cache_call("query_skaters")
+    default_team, default_season = current_partition()
+    frame = _query_skaters(data_version(), tuple(columns) if columns else None, team or default_team, season or default_season, min_gp)
+    return frame.copy(deep=False)
+
+
+def league_skaters(columns=None, min_gp=None):
+    # Every skater season in the database, all teams and seasons
+    metrics.cache_call("query_skaters")
+    return _query_skaters(data_version(), tuple(columns) if columns else None, None, None, min_gp).copy(deep=False)
+
+
+@st.cache_resource(max_entries=32)
+def _query_table(version, table, columns, keys):
+    metrics.cache_miss("query_table")
+    with connection() as conn:
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+        if not existing:
+            return pd.DataFrame()   # not in this database, e.g. no league CSVs ingested
+        if columns:
+            columns = [col for col in columns if col in existing]
+        return _read_partition(conn, table, columns, **dict(keys))
+
+
+def _lookup(table, columns=None, **keys):
+    metrics.cache_call("query_table")
+    return _query_table(data_version(), table, tuple(columns) if columns else None, tuple(keys.items())).copy(deep=False)
+
+
+# Rollups materialized by build_db.py, so the summary tabs never aggregate in pandas
+
+@metrics.timed("team_rollup")
+def team_rollup(team=None, season=None):
+    # Skater totals and averages by position; the "ALL" row is the whole roster
+    default_team, default_season = current_partition()
+    return _lookup("team_rollup", Team=team or default_team, Season=season or default_season).set_index("Pos")
+
+
+@metrics.timed("league_rollup")
+def league_rollup(season=None):
+    # Mean and percentiles of each team-level stat across the league, indexed by
+    # (Source, Stat). Empty when the season has no league CSVs.
+    rollup = _lookup("league_rollup", Season=season or current_partition()[1])
+    return rollup.set_index(["Source", "Stat"]) if len(rollup.columns) else rollup
+
+
+@metrics.timed("league_table")
+def league_table(columns=None, season=None):
+    # The season's team_stats rows, projected in SQL; unknown columns are skipped.
+    # Empty when the season has no nhl_team_stats CSV.
+    return _lookup("team_stats", columns, Season=season or current_partition()[1])
+
+
+# Shot density grids pre-binned by build_db.py (see shots.py)
+
+@st.cache_resource(max_entries=8)
+def _shot_players(version, team, season):
+    with connection() as conn:
+        try:
+            rows = conn.execute(
+                'SELECT DISTINCT "Player" FROM shot_bins WHERE "Team" = ? AND "Season" = ? ORDER BY "Player"', (team, season)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return []   # no shot events ingested into this database yet
+    players = [row[0] for row in rows]
+    # The whole-team grid first
+    return sorted(players, key=lambda player: player != shots.TEAM_ROW)
+
+
+def shot_players(team=None, season=None):
+    # Shooters with a density grid for the partition; empty without shot data
+    default_team, default_season = current_partition()
+    return list(_shot_players(data_version(), team or default_team, season or default_season))
+
+
+@st.cache_resource(max_entries=64)
+def _shot_grid(version, team, season, player, layer, level):
+    metrics.cache_miss("shot_grid")
+    with connection() as conn, metrics.span("sqlite.read[shot_bins]"):
+        row = conn.execute(
+            'SELECT "BinFt", "Rows", "Cols", "Shots", "Counts" FROM shot_bins '
+            'WHERE "Team" = ? AND "Season" = ? AND "Player" = ? AND "Layer" = ? AND "Level" = ?',
+            (team, season, player, layer, level),
+        ).fetchone()
+    if row is None:
+        return None
+    bin_ft, rows, cols, total, blob = row
+    # np.frombuffer over the decompressed bytes is read-only, so sessions can share it
+    return shots.decode(blob, rows, cols), bin_ft, total
+
+
+@metrics.timed("shot_grid")
+def shot_grid(player, layer, level, team=None, season=None):
+    # (counts, bin_ft, shots) for one pyramid level, or None. counts[row, col] is
+    # the bin_ft square at (col, row) * bin_ft feet from the rink's (-100, -42.5) corner.
+    metrics.cache_call("shot_grid")
+    default_team, default_season = current_partition()
+    return _shot_grid(data_version(), team or default_team, season or default_season, player, layer, level)
+
+
+def _warm(version, team, season, skater_queries, league_columns, skater_indexes, league_index, similarity):
+    # Runs on the prefetch thread: the cached functions are called with explicit
+    # keys because session state isn't available off the script thread
+    with metrics.span("prefetch"):
+        _load(version, team, season)
+        for columns, min_gp in skater_queries:
+            _query_skaters(version, columns, team, season, min_gp)
+        _query_table(version, "team_rollup", None, (("Team", team), ("Season", season)))
+        _query_table(version, "league_rollup", None, (("Season", season),))
+        if league_columns:
+            _query_table(version, "team_stats", tuple(league_columns), (("Season", season),))
+        # The indexes the tabs query, built from the frames above. Both modules
+        # import this one, so they are imported here rather than at the top.
+        if skater_indexes or league_index:
+            import query_engine
+            for columns, min_gp in skater_indexes:
+                query_engine._skater_index(version, columns, team, season, min_gp)
+            if league_index:
+                query_engine._league_index(version)
+        if similarity:
+            import similarity as similar
+            similar._index(version, season)
+
+
+def prefetch(skater_queries=(), league_columns=None, team=None, season=None, skater_indexes=(), league_index=False, similarity=False):
+    # Load what the tabs that aren't open will read, in the background, once per
+    # data version and partition, so opening one doesn't wait on SQLite.
+    # skater_queries is a list of (columns, min_gp) for query_skaters() and
+    # skater_indexes the same for query_engine.skater_index(); league_index and
+    # similarity also build query_engine.league_index() and the season's
+    # similarity.similarity_index().
+    default_team, default_season = current_partition()
+    key = (data_version(), team or default_team, season or default_season)
+    with _pools_lock:
+        if key in _prefetched:
+            return
+        _prefetched.add(key)
+    _prefetcher.submit(
+        _warm, *key,
+        [(tuple(c) if c else None, g) for c, g in skater_queries], league_columns,
+        [(tuple(c) if c else None, g) for c, g in skater_indexes], league_index, similarity,
+    )
@@ -0,0 +1,11 @@
+# Player feature definitions shared by build_db.py, which materializes the
+# player_features table at ingest, and similarity.py, which reads it. Kept out
+# of build_db.py so the app doesn't import the ingest script for a constant.
+
+# Per-game possession, deployment and scoring rates behind the similarity search
+PLAYER_FEATURES = ["CF%", "FF%", "CF% rel", "CF/GP", "CA/GP", "oZS%", "TOI/60", "TOI(EV)", "G/GP", "A/GP", "PTS/GP", "SAtt./GP"]
+FEATURE_MIN_GP = 10   # per-game rates below this are mostly noise
+
+# The Skater tab's pool. Its CF_%/FF_% roster shares are taken over the same
+# skaters, so the bars it shows add up to the whole of that pool.
+SKATER_TAB_MIN_GP = 10
@@ -1,137 +1,130 @@
+import functools
+import io
+import logging
+import time
+
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.express as px
-import seaborn as sns
-import plotly.graph_objects as go
-import sqlite3
-
-DB_PATH = "nhl_data.db"
-
-@st.cache_data
-def load_data_from_sqlite():
-    conn = sqlite3.connect(DB_PATH)
-
-    flyers_standard = pd.read_sql("SELECT * FROM flyers_standard_2024", conn)
-    flyers_advanced = pd.read_sql("SELECT * FROM flyers_advanced_2024", conn)
-    flyers_goalie = pd.read_sql("SELECT * FROM flyers_goalie_2024", conn)
-    flyers_misc = pd.read_sql("SELECT * FROM flyers_misc_2024", conn)
-    nhl_team_stats = pd.read_sql("SELECT * FROM nhl_team_stats_2024", conn)
-
-    flyers_standard = flyers_standard.rename(columns={
-        flyers_standard.columns[1]: "Player",
-        flyers_standard.columns[4]: "GP",
-        flyers_standard.columns[10]: "G",
-        flyers_standard.columns[14]: "A",
-        flyers_standard.columns[8]: "PIM",
-        flyers_standard.columns[9]: "+/-"
-    })
-
-    flyers_advanced = flyers_advanced.rename(columns={
-        flyers_advanced.columns[1]: "Player",
-        flyers_advanced.columns[4]: "GP",
-        flyers_advanced.columns[5]: "CF",
-        flyers_advanced.columns[9]: "FF",
-        flyers_advanced.columns[16]: "oZS%",
-        flyers_advanced.columns[17]: "dZS%",
-        flyers_advanced.columns[3]: "Pos"
-    })
-
-    flyers_merged = pd.merge(flyers_advanced, flyers_standard[["Player", "G", "A", "PIM", "+/-"]], on="Player", how="left")
-
-    for col in ["GP", "G", "A", "PIM", "+/-", "CF", "FF", "oZS%", "dZS%"]:
-        if col in flyers_merged.columns:
-            flyers_merged[col] = pd.to_numeric(flyers_merged[col], errors='coerce')
-
-    conn.close()
-    return flyers_merged, flyers_goalie, flyers_misc, nhl_team_stats
-
-flyers_advanced, flyers_goalie, flyers_misc, nhl_team_stats = load_data_from_sqlite()
-
-if flyers_advanced is None:
-    st.stop()
-
-flyers_advanced = flyers_advanced[flyers_advanced['GP'] >= 10]
-st.title("Philadelphia Flyers Advanced Analytics Dashboard")
-
-tabs = st.tabs(["Flyers Player Visuals", "Team Summary", "League Stats", "Goalie Stats", "Player Compare", "Rink Map"])
+
+# Heavy plotting and ML libraries are imported inside the tab that uses them,
+# so cold start only pays for Streamlit and the data layer.
+from data_store import (
+    current_partition, league_rollup, league_table, load_data, partition_selector, prefetch, query_skaters,
+    refresh_on_new_data, team_label, team_rollup,
+)
+from features import SKATER_TAB_MIN_GP
+from metrics import render_debug_panel, span
+import prerender
+import tab_names
+
+# Target for one widget change. Each tab body is a fragment, so a widget only
+# reruns the tab it lives in, and only the open tab runs on a full rerun.
+RERUN_BUDGET_MS = 250
+SWEEP_POLL_S = 2   # how often a running silhouette sweep is checked for scores
+
+# Data the tabs read, also listed for prefetch() below
+SKATER_VISUALS_COLUMNS = ["Player", "GP", "G", "A", "PTS", "PTS_per_GP", "CF", "CA", "oZS%", "dZS%", "CF60", "FF60", "CF_%", "FF_%"]
+COMPARE_COLUMNS = ["Player", "G", "A"]
+LEAGUE_COLUMNS = ["Team", "GP", "W", "L", "PTS", "PTS%", "GF", "GA", "SV%", "S%", "PP%", "PK%"]
+
+logger = logging.getLogger(__name__)
+
+
+def tab_fragment(func):
+    # Run a tab body as its own fragment and record how long it took
+    @functools.wraps(func)
+    def run():
+        start = time.perf_counter()
+        with span(f"tab.{func.__name__}"):
+            func()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        st.session_state.setdefault("tab_latency_ms", {})[func.__name__] = elapsed_ms
+        if elapsed_ms > RERUN_BUDGET_MS:
+            logger.warning("%s took %.0f ms (budget %d ms)", func.__name__, elapsed_ms, RERUN_BUDGET_MS)
+    return st.fragment(run)
+
 
 # --------------------------- TAB 1 ---------------------------
-with tabs[0]:
-    st.header("Flyers Skater Analytics Dashboard (Min 10 GP)")
+@tab_fragment
+def render_skater_tab():
+    import plotly.express as px
+
+    from query_engine import skater_index
 
-    flyers_advanced["PTS"] = flyers_advanced["G"] + flyers_advanced["A"]
-    flyers_advanced["CF60"] = flyers_advanced["CF"] / flyers_advanced["GP"] * 60
-    flyers_advanced["FF60"] = flyers_advanced["FF"] / flyers_advanced["GP"] * 60
+    # Leaderboards come off the index's per-column sort orders, not a sort per chart
+    leaders = skater_index(SKATER_VISUALS_COLUMNS, min_gp=SKATER_TAB_MIN_GP)
+    flyers_advanced = leaders.frame
+    nickname = team_label(current_partition()[0]).split()[-1]
+
+    st.header(f"{nickname} Skater Analytics Dashboard (Min {SKATER_TAB_MIN_GP} GP)")
+
+    # PTS, PTS_per_GP, CF60/FF60 (per 60 min of even-strength TOI) and the
+    # CF_%/FF_% shares of this pool's total are precomputed by build_db.py
 
     st.subheader("Player Production: Goals, Assists, and Total Points")
-    production_df = flyers_advanced[["Player", "G", "A", "PTS"]].copy().dropna().sort_values("PTS", ascending=False).head(15)
-    production_melted = production_df.melt(id_vars="Player", value_vars=["G", "A", "PTS"], var_name="Stat", value_name="Count")
-    fig7 = px.bar(production_melted, x="Player", y="Count", color="Stat", barmode="group",
-                  title="Top 15 Flyers by Goals, Assists, and Total Points")
-    fig7.update_layout(xaxis_tickangle=-45, height=600)
-    st.plotly_chart(fig7, use_container_width=True)
-    st.caption("This grouped bar chart shows which players are contributing most to the Flyers’ offense in terms of goals, assists, and total points. A General Manager (GM) can use this to evaluate whether the team needs more finishers (goal scorers), playmakers (assisters), or well-rounded producers.")
+    def production_chart():
+        production_df = leaders.take(leaders.top("PTS", 15))[["Player", "G", "A", "PTS"]]
+        production_melted = production_df.melt(id_vars="Player", value_vars=["G", "A", "PTS"], var_name="Stat", value_name="Count")
+        fig7 = px.bar(production_melted, x="Player", y="Count", color="Stat", barmode="group",
+                      title=f"Top 15 {nickname} by Goals, Assists, and Total Points")
+        fig7.update_layout(xaxis_tickangle=-45, height=600)
+        return fig7
+    prerender.plotly_chart("skater.production", production_chart, width="stretch")
+    st.caption(f"This grouped bar chart shows which players are contributing most to the {nickname}’ offense in terms of goals, assists, and total points. A General Manager (GM) can use this to evaluate whether the team needs more finishers (goal scorers), playmakers (assisters), or well-rounded producers.")
 
     st.subheader("CF/60 vs Points per Game (PTS/GP)")
 
-# Calculate Points per Game
-    flyers_advanced["PTS_per_GP"] = flyers_advanced["PTS"] / flyers_advanced["GP"]
-
 # Create the improved scatter plot
-    fig1 = px.scatter(
-        flyers_advanced,
-        x="CF60",
-        y="PTS_per_GP",
-        text="Player",
-        hover_data=["GP", "G", "A", "PTS"],
-        color="Player",
-        labels={
-            "CF60": "Corsi For per 60 (CF/60)",
-            "PTS_per_GP": "Points per Game (PTS/GP)"
-        },
-        title="Possession vs Offensive Output: CF/60 vs Points per Game"
-    )
-
-    fig1.update_traces(marker=dict(size=12), textposition="top center")
-    fig1.update_layout(width=900, height=600)
-    st.plotly_chart(fig1, use_container_width=True)
+    def possession_vs_output_chart():
+        fig1 = px.scatter(
+            flyers_advanced,
+            x="CF60",
+            y="PTS_per_GP",
+            text="Player",
+            hover_data=["GP", "G", "A", "PTS"],
+            color="Player",
+            labels={
+                "CF60": "Corsi For per 60 (CF/60)",
+                "PTS_per_GP": "Points per Game (PTS/GP)"
+            },
+            title="Possession vs Offensive Output: CF/60 vs Points per Game"
+        )
+
+        fig1.update_traces(marker=dict(size=12), textposition="top center")
+        fig1.update_layout(width=900, height=600)
+        return fig1
+    prerender.plotly_chart("skater.cf60_vs_pts_per_gp", possession_vs_output_chart, width="stretch")
 
 # Add new explanatory caption
     st.caption("This scatter plot compares Corsi For per 60 minutes (CF/60)—which measures how many shot attempts a player helps generate during their time on ice—with Points per Game (PTS/GP), a standard indicator of scoring output. CF/60 highlights players who are actively driving puck possession and offensive pressure, while PTS/GP shows who is converting those opportunities into tangible results. Players in the top-right quadrant are the most complete offensive contributors: they consistently tilt the ice in their team’s favor and finish plays with goals or assists. These are the ideal dual-threat players that coaches and GMs prioritize when building scoring lines. In contrast, players in the top-left may generate pressure but fail to capitalize, signaling a possible finishing issue. Those in the bottom-right might have scoring totals buoyed by power play time or")
     st.subheader("Top oZS% (Offensive Zone Start%)")
-    top_ozs = flyers_advanced.sort_values("oZS%", ascending=False).head(10)
-    fig2 = px.bar(top_ozs, x="oZS%", y="Player", orientation="h",
-                  color="oZS%", title="Top 10 Flyers by Offensive Zone Start %")
-    fig2.update_layout(yaxis=dict(autorange="reversed"))
-    st.plotly_chart(fig2, use_container_width=True)
+    def top_ozs_chart():
+        top_ozs = leaders.take(leaders.top("oZS%", 10))
+        fig2 = px.bar(top_ozs, x="oZS%", y="Player", orientation="h",
+                      color="oZS%", title=f"Top 10 {nickname} by Offensive Zone Start %")
+        fig2.update_layout(yaxis=dict(autorange="reversed"))
+        return fig2
+    prerender.plotly_chart("skater.top_ozs", top_ozs_chart, width="stretch")
     st.caption("Offensive Zone Start Percentage (oZS%) measures how frequently a player begins their shifts with a faceoff in the offensive zone, offering insight into how coaches choose to deploy their players. A high oZS% suggests that a player is being given favorable conditions to generate scoring chances, often reflecting a level of trust in their offensive abilities. However, deployment alone doesn’t guarantee results. By comparing oZS% to actual shot generation or point production, General Managers can evaluate whether a player is capitalizing on the opportunities they're given. If a player has a high oZS% but low output, it may indicate inefficiency or misuse; conversely, a player with modest oZS% but strong results might be underutilized. This metric helps GMs assess not only individual effectiveness but also coaching strategy and lineup optimization.")
 
     st.subheader("Player Share of Team CF and FF")
-    total_cf = flyers_advanced["CF"].sum()
-    total_ff = flyers_advanced["FF"].sum()
-    flyers_advanced["CF_%"] = flyers_advanced["CF"] / total_cf * 100
-    flyers_advanced["FF_%"] = flyers_advanced["FF"] / total_ff * 100
-
-    fig4 = px.bar(flyers_advanced.sort_values("CF_%", ascending=False),
-                  x="CF_%", y="Player", orientation="h",
-                  title="Corsi For % Contribution by Player")
-    fig4.update_layout(yaxis=dict(autorange="reversed"))
-    st.plotly_chart(fig4, use_container_width=True)
-
-    fig5 = px.bar(flyers_advanced.sort_values("FF_%", ascending=False),
-                  x="FF_%", y="Player", orientation="h",
-                  title="Fenwick For % Contribution by Player")
-    fig5.update_layout(yaxis=dict(autorange="reversed"))
-    st.plotly_chart(fig5, use_container_width=True)
+
+    def share_chart(column, title):
+        fig = px.bar(leaders.take(leaders.top(column)),
+                     x=column, y="Player", orientation="h", title=title)
+        fig.update_layout(yaxis=dict(autorange="reversed"))
+        return fig
+    prerender.plotly_chart("skater.cf_share", lambda: share_chart("CF_%", "Corsi For % Contribution by Player"), width="stretch")
+    prerender.plotly_chart("skater.ff_share", lambda: share_chart("FF_%", "Fenwick For % Contribution by Player"), width="stretch")
     st.caption("These horizontal bar charts show the percentage of total team shot attempts—measured by Corsi (CF) and Fenwick (FF)—that each player contributes over the season. Corsi counts all shot attempts, while Fenwick excludes blocked shots, making both metrics valuable for understanding puck possession. By expressing each player’s contribution as a percentage of the team total, we can clearly identify which individuals are consistently driving play. Players with the highest values are not just involved in offensive sequences—they’re the engines behind them. This allows General Managers to pinpoint who the team relies on to sustain offensive pressure, even beyond traditional stats like goals or assists. It also reveals players who may be undervalued or overused in their roles. A GM can use this data to determine line combinations, special teams assignments, or even make trade decisions based on possession impact rather than just scoring.")
 
     st.subheader("oZS% vs FF/60")
-    fig6 = px.scatter(flyers_advanced, x="oZS%", y="FF60", text="Player", color="Player",
-                      title="Deployment vs Shot Generation: oZS% vs FF/60",
-                      labels={"oZS%": "Offensive Zone Start %", "FF60": "Fenwick For per 60"})
-    fig6.update_traces(marker=dict(size=12), textposition="top center")
-    st.plotly_chart(fig6, use_container_width=True)
+    def deployment_chart():
+        fig6 = px.scatter(flyers_advanced, x="oZS%", y="FF60", text="Player", color="Player",
+                          title="Deployment vs Shot Generation: oZS% vs FF/60",
+                          labels={"oZS%": "Offensive Zone Start %", "FF60": "Fenwick For per 60"})
+        fig6.update_traces(marker=dict(size=12), textposition="top center")
+        return fig6
+    prerender.plotly_chart("skater.ozs_vs_ff60", deployment_chart, width="stretch")
     st.caption("This scatter plot compares how often players begin their shifts in the offensive zone (oZS%) with how frequently they generate unblocked shot attempts per 60 minutes (FF/60). A high oZS% means the coach is deliberately deploying a player in more favorable, offensive situations. FF/60 reflects how active a player is in helping the team generate legitimate scoring chances — specifically those that get past defenders.")
     st.caption("Players located in the top-right quadrant of this chart are making the most of their opportunities: they are trusted with offensive zone starts and are delivering high shot generation. This suggests they are valuable assets who can be relied on to sustain pressure in the opponent’s end.")
     st.caption("Meanwhile, players in the bottom-right quadrant are being deployed offensively but not generating many chances — a potential red flag for inefficiency. Conversely, those in the top-left quadrant are creating scoring opportunities despite fewer offensive zone starts, which may indicate hidden value or underutilization.")
@@ -139,62 +132,64 @@ with tabs[0]:
 
 #-----------------------------------------------------------------
 
-    import plotly.express as px
-    from sklearn.preprocessing import StandardScaler
-    from sklearn.cluster import KMeans
-    import streamlit as st
-
-    # Load Flyers advanced stats CSV
-    flyers_advanced = pd.read_csv("flyers_advanced_2024.csv", header=1)
-    flyers_standard = pd.read_csv("flyers_standard_2024.csv", header=1)
-    flyers_advanced = pd.read_csv("flyers_advanced_2024.csv", header=1)
-
-    # Merge G and A from standard into advanced
-    flyers_advanced = pd.merge(
-        flyers_advanced,
-        flyers_standard[["Player", "G", "A"]],
-        on="Player",
-        how="left"
-    )
-
-    # Filter players with at least 10 GP and drop missing values
-    filtered_df = flyers_advanced[flyers_advanced["GP"] >= 10].dropna(subset=["CF", "CA", "oZS%", "dZS%"])
-
-    # Select features and player names
-    X = filtered_df[["CF", "CA", "oZS%", "dZS%"]]
-    player_names = filtered_df["Player"]
-
-    # Standardize the data
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-
-    # KMeans clustering into 4 groups
-    kmeans = KMeans(n_clusters=4, random_state=42, n_init=10)
-    clusters = kmeans.fit_predict(X_scaled)
-
-    # Add cluster labels
-    filtered_df["Role Cluster"] = clusters
-
-    # Create an interactive scatterplot
-    fig = px.scatter(
-        filtered_df,
-        x="CF",
-        y="CA",
-        color="Role Cluster",
-        text="Player",
-        hover_data=["GP", "oZS%", "dZS%"],
-        title="Flyers Player Archetypes: Corsi For vs Corsi Against (Clustered)",
-        labels={"CF": "Corsi For", "CA": "Corsi Against"}
-    )
-    fig.update_traces(marker=dict(size=12), textposition="top center")
-    fig.update_layout(height=600)
+    from clustering import ROLE_FEATURES, best_k, fit_roles, start_k_sweep
+
+    # Players in the pool that have possession and deployment numbers
+    filtered_df = flyers_advanced.dropna(subset=ROLE_FEATURES).copy()
+    if len(filtered_df) < 2:
+        st.info(f"Role clusters need at least two skaters with {SKATER_TAB_MIN_GP}+ GP and possession numbers.")
+        return
+
+    # Fitted model is cached on the input data, so reruns don't refit. k is
+    # capped by the rows available (the silhouette sweep needs one more row than k).
+    max_k = max(2, min(8, len(filtered_df) - 1))
+    n_clusters = min(4, max_k)
+    with st.expander("Choose the number of role clusters"):
+        n_clusters = st.number_input("Clusters (k)", min_value=2, max_value=max_k, value=min(4, max_k))
+        if st.toggle("Score k = 2..8 with silhouette"):
+            sweep = start_k_sweep(filtered_df[ROLE_FEATURES])
+            polling = not sweep.done()
+
+            # Checks the background sweep every SWEEP_POLL_S until it is done, then
+            # reruns the page once so the scores are drawn by a fragment that no longer polls
+            @st.fragment(run_every=SWEEP_POLL_S if polling else None)
+            def sweep_scores():
+                if not sweep.done():
+                    st.info("Silhouette sweep is running in the background. The scores appear here when it finishes.")
+                elif polling:
+                    st.rerun()
+                else:
+                    scores = sweep.result()
+                    if len(scores):
+                        st.bar_chart(scores.set_index("k"))
+                        st.caption(f"Highest silhouette score at k = {best_k(scores)}.")
+            sweep_scores()
+
+    def roles_chart():
+        # Add cluster labels
+        filtered_df["Role Cluster"] = fit_roles(filtered_df[ROLE_FEATURES], n_clusters=int(n_clusters))
+
+        # Create an interactive scatterplot
+        fig = px.scatter(
+            filtered_df,
+            x="CF",
+            y="CA",
+            color="Role Cluster",
+            text="Player",
+            hover_data=["GP", "oZS%", "dZS%"],
+            title=f"{nickname} Player Archetypes: Corsi For vs Corsi Against (Clustered)",
+            labels={"CF": "Corsi For", "CA": "Corsi Against"}
+        )
+        fig.update_traces(marker=dict(size=12), textposition="top center")
+        fig.update_layout(height=600)
+        return fig
 
     # Display in Streamlit
-    st.plotly_chart(fig)
+    prerender.plotly_chart(f"skater.roles[k={int(n_clusters)}]", roles_chart)
 
     # Caption for context
     st.caption(
-       "This chart visualizes Flyers players by clustering them into role-based archetypes using shot generation (Corsi For), shot suppression (Corsi Against), and zone deployment (oZS%, dZS%). Players are grouped not by position or ice time, but by how they tilt the ice and how coaches use them."
+       f"This chart visualizes {nickname} players by clustering them into role-based archetypes using shot generation (Corsi For), shot suppression (Corsi Against), and zone deployment (oZS%, dZS%). Players are grouped not by position or ice time, but by how they tilt the ice and how coaches use them."
        "Offensive Drivers (e.g. Cluster 0) are given offensive zone starts and generate heavy shot volume while limiting chances against."
        "Defensive Anchors (Cluster 1) start in their own zone and effectively suppress opposing chances."
        "Transition Players (Cluster 2) are balanced in usage and performance — versatile in all situations."
@@ -203,77 +198,85 @@ with tabs[0]:
     )
 
 #-----------------------------------------------------------------
-with tabs[1]:
-    st.header("Flyers 2024 Team Summary Dashboard")
-
-    # Load Flyers player stats from CSV
-    flyers_advanced = pd.read_csv("flyers_advanced_2024.csv", header=1)
-    flyers_standard = pd.read_csv("flyers_standard_2024.csv", header=1)
-
-    # Merge goals and assists into flyers_advanced
-    flyers_advanced = pd.merge(
-        flyers_advanced,
-        flyers_standard[["Player", "G", "A"]],
-        on="Player",
-        how="left"
-    )
+@tab_fragment
+def render_team_summary_tab():
+    import plotly.express as px
 
-    # Load NHL team stats from CSV
-    nhl_team_stats = pd.read_csv("nhl_team_stats_2024.csv", header=1)
-    nhl_team_stats = nhl_team_stats.rename(columns={"Unnamed: 1": "Team"})
+    team, season = current_partition()
+    nickname = team_label(team).split()[-1]
+    st.header(f"{nickname} {season} Team Summary Dashboard")
 
-    # === Flyers Team Stats ===
-    total_goals = flyers_advanced["G"].sum()
-    total_assists = flyers_advanced["A"].sum()
-    total_points = total_goals + total_assists
-    avg_cf = flyers_advanced["CF"].mean()
-    avg_ca = flyers_advanced["CA"].mean()
-    avg_ozs = flyers_advanced["oZS%"].mean()
-    avg_dzs = flyers_advanced["dZS%"].mean()
+    # Totals and averages come from the rollups build_db.py materializes at ingest
+    rollup = team_rollup()
+    league = league_rollup()
 
-    # === League Averages ===
-    league_avg_goals = nhl_team_stats["GF"].mean()
-    league_avg_assists = league_avg_goals * 1.5  # rough estimate
-    league_avg_points = league_avg_goals + league_avg_assists
+    # === Team Stats ===
+    roster = rollup.loc["ALL"]
+    total_goals = int(roster["G"])
+    total_assists = int(roster["A"])
+    total_points = int(roster["PTS"])
+    avg_cf = roster["CF avg"]
+    avg_ca = roster["CA avg"]
+    avg_ozs = roster["oZS% avg"]
+    avg_dzs = roster["dZS% avg"]
 
-    # === Stat Deltas (Flyers vs League) ===
-    goals_delta = total_goals - league_avg_goals
-    assists_delta = total_assists - league_avg_assists
-    points_delta = total_points - league_avg_points
+    # === League Averages ===
+    # A partition can be loaded without the season's nhl_team_stats CSV
+    has_league = ("team_stats", "GF") in league.index
+    if has_league:
+        league_avg_goals = league.loc[("team_stats", "GF"), "mean"]
+        league_avg_assists = league_avg_goals * 1.5  # rough estimate
+        league_avg_points = league_avg_goals + league_avg_assists
+
+        # === Stat Deltas (Team vs League) ===
+        goals_delta = f"{total_goals - league_avg_goals:+.0f}"
+        assists_delta = f"{total_assists - league_avg_assists:+.0f}"
+        points_delta = f"{total_points - league_avg_points:+.0f}"
+    else:
+        goals_delta = assists_delta = points_delta = None
 
     # === TOP ROW ===
     st.subheader("Overall Production vs League Avg")
     col1, col2, col3 = st.columns(3)
-    col1.metric("Goals", f"{total_goals}", f"{goals_delta:+.0f}")
-    col2.metric("Assists", f"{total_assists}", f"{assists_delta:+.0f}")
-    col3.metric("Points", f"{total_points}", f"{points_delta:+.0f}")
+    col1.metric("Goals", f"{total_goals}", goals_delta)
+    col2.metric("Assists", f"{total_assists}", assists_delta)
+    col3.metric("Points", f"{total_points}", points_delta)
+    if not has_league:
+        st.info(f"No league benchmarks for {season}. Add nhl_team_stats_{season}.csv and run build_db.py to compare against the league.")
 
     # === MIDDLE ROW ===
     st.subheader("Average Possession Performance")
-    fig_possession = px.bar(
-        x=["Corsi For", "Corsi Against", "Corsi Differential"],
-        y=[avg_cf, avg_ca, avg_cf - avg_ca],
-        labels={"x": "Metric", "y": "Average Value"},
-        text=[f"{avg_cf:.1f}", f"{avg_ca:.1f}", f"{(avg_cf - avg_ca):.1f}"],
-        color_discrete_sequence=["#1f77b4", "#d62728", "#2ca02c"]
-    )
-    fig_possession.update_layout(height=400)
-    st.plotly_chart(fig_possession, use_container_width=True)
+    def possession_chart():
+        fig_possession = px.bar(
+            x=["Corsi For", "Corsi Against", "Corsi Differential"],
+            y=[avg_cf, avg_ca, avg_cf - avg_ca],
+            labels={"x": "Metric", "y": "Average Value"},
+            text=[f"{avg_cf:.1f}", f"{avg_ca:.1f}", f"{(avg_cf - avg_ca):.1f}"],
+            color_discrete_sequence=["#1f77b4", "#d62728", "#2ca02c"]
+        )
+        fig_possession.update_layout(height=400)
+        return fig_possession
+    prerender.plotly_chart("team.possession", possession_chart, width="stretch")
 
     # === BOTTOM ROW ===
     st.subheader("Average Deployment (Zone Start %)")
-    fig_zone = px.pie(
-        names=["Offensive Zone Start", "Defensive Zone Start"],
-        values=[avg_ozs, avg_dzs],
-        color_discrete_sequence=["#FFA15A", "#19D3F3"],
-        hole=0.45
-    )
-    fig_zone.update_traces(textinfo='label+percent')
-    st.plotly_chart(fig_zone, use_container_width=True)
+    def zone_start_chart():
+        fig_zone = px.pie(
+            names=["Offensive Zone Start", "Defensive Zone Start"],
+            values=[avg_ozs, avg_dzs],
+            color_discrete_sequence=["#FFA15A", "#19D3F3"],
+            hole=0.45
+        )
+        fig_zone.update_traces(textinfo='label+percent')
+        return fig_zone
+    prerender.plotly_chart("team.zone_starts", zone_start_chart, width="stretch")
+
+    st.subheader("Production by Position")
+    st.dataframe(rollup.drop(index="ALL").round(1), width="stretch")
 
     st.caption(
-        "This dashboard provides a full-scope view of the Flyers' offensive totals, possession quality, and deployment strategy, "
-        "with context against league averages. GM-level insights come from seeing how team scoring stacks up and whether the Flyers "
+        f"This dashboard provides a full-scope view of the {nickname}' offensive totals, possession quality, and deployment strategy, "
+        f"with context against league averages. GM-level insights come from seeing how team scoring stacks up and whether the {nickname} "
         "generate more chances than they allow, and how coaching decisions impact starting position."
     )
 
@@ -281,20 +284,27 @@ with tabs[1]:
 
 
 
-# --------------------------- TAB 3 ---------------------------
-with tabs[2]:
+# --------------------------- TAB 2 ---------------------------
+@tab_fragment
+def render_league_tab():
     st.header("NHL Team Stats Overview")
 
-    # Load the CSV and rename the correct column
-    nhl_team_stats = pd.read_csv("nhl_team_stats_2024.csv", header=1)
-    nhl_team_stats = nhl_team_stats.rename(columns={"Unnamed: 1": "Team"})
+    # Optional: display only relevant columns (projected in SQL, missing ones skipped)
+    columns_to_show = LEAGUE_COLUMNS
+    nhl_team_stats = league_table(columns_to_show)
+    league = league_rollup()
 
-    # Optional: display only relevant columns
-    columns_to_show = ["Team", "GP", "W", "L", "PTS", "PTS%", "GF", "GA", "SV%", "S%", "PP%", "PK%"]
-    columns_to_show = [col for col in columns_to_show if col in nhl_team_stats.columns]
+    if nhl_team_stats.empty or "team_stats" not in league.index.get_level_values(0):
+        season = current_partition()[1]
+        st.info(f"No league team stats for {season}. Add nhl_team_stats_{season}.csv and run build_db.py.")
+    else:
+        # Properly hide the index column
+        st.dataframe(nhl_team_stats.style.hide(axis="index"), width="stretch")
 
-    # Properly hide the index column
-    st.dataframe(nhl_team_stats[columns_to_show].style.hide(axis="index"), use_container_width=True)
+        # League spread of the same stats, precomputed per season
+        st.subheader("League Benchmarks")
+        benchmarks = league.loc["team_stats"]
+        st.dataframe(benchmarks.loc[[col for col in columns_to_show if col in benchmarks.index]].round(2), width="stretch")
 
     st.caption(
         "This table presents core statistics for all NHL teams, allowing for league-wide benchmarking. "
@@ -302,97 +312,210 @@ with tabs[2]:
         "to better assess their own team's standing and prioritize roster decisions."
     )
 
+    # Every skater season loaded, filtered and ranked through the query engine's
+    # sorted per-stat indexes rather than a mask and sort over the whole pool
+    from query_engine import league_index
+
+    st.subheader("Skater Leaderboard")
+    pool = league_index()
+    stats = [stat for stat in pool.stats if stat not in ("Rk", "Season")]
+    col1, col2, col3 = st.columns(3)
+    rank_by = col1.selectbox("Rank by", stats, index=stats.index("PTS") if "PTS" in stats else 0)
+    top_n = col2.number_input("Top", min_value=5, max_value=100, value=25, step=5)
+    filter_on = col3.multiselect("Filter on", stats, default=["GP"] if "GP" in stats else [])
+
+    ranges = {}
+    for stat in filter_on:
+        low, high = (float(v) for v in pool.bounds(stat))
+        if low < high:
+            ranges[stat] = st.slider(stat, min_value=low, max_value=high, value=(low, high))
+    rows = pool.select(ranges)
+    leaderboard = pool.take(pool.top(rank_by, int(top_n), rows))
+    shown = ["Season", "Team", "Player", "Pos", "GP", rank_by, *filter_on]
+    st.dataframe(leaderboard[[col for col in dict.fromkeys(shown) if col in leaderboard.columns]],
+                 hide_index=True, width="stretch")
+    st.caption(f"{len(rows):,} of {len(pool):,} skater seasons match the filters.")
+
 
 
 # --------------------------- TAB 3 ---------------------------
-with tabs[3]:
-    
-    flyers_goalie = pd.read_csv("flyers_goalie_2024.csv", header=1)
+@tab_fragment
+def render_goalie_tab():
+    import matplotlib.pyplot as plt
+    import plotly.express as px
 
-    goalie_df = flyers_goalie[["Player", "GP", "W", "L", "GA", "SV%", "GAA"]].sort_values("GP", ascending=False)
+    data = load_data()
+    flyers_goalie = data.goalies
+    nickname = team_label(data.team).split()[-1]
+
+    goalie_df = flyers_goalie[["Player", "GP", "W", "L", "GA", "SV%", "GAA", "SA60", "GSAA60", "TOI_%"]].sort_values("GP", ascending=False)
     st.dataframe(goalie_df)
 
     # Optional: bar chart
-    fig, ax = plt.subplots(figsize=(10, 5))
-    goalie_df.set_index("Player")[["SV%", "GAA"]].plot(kind="bar", ax=ax)
-    ax.set_title("Flyers Goalies - Save % and GAA")
-    ax.set_ylabel("Value")
-    st.pyplot(fig)
+    def save_pct_gaa_png():
+        fig, ax = plt.subplots(figsize=(10, 5))
+        goalie_df.set_index("Player")[["SV%", "GAA"]].plot(kind="bar", ax=ax)
+        ax.set_title(f"{nickname} Goalies - Save % and GAA")
+        ax.set_ylabel("Value")
+        # Same PNG st.pyplot would send, so it can be stored by report.py
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=200, bbox_inches="tight")
+        plt.close(fig)
+        return buffer.getvalue()
+    with span("goalie.st_image"):
+        prerender.image("goalie.save_pct_gaa", save_pct_gaa_png, width="stretch")
 
     st.subheader("Save Percentage vs Goals Against Average")
 
-    goalie_data = flyers_goalie[["Player", "SV%", "GAA", "GP"]].dropna()
-    goalie_data = goalie_data[goalie_data["GP"] >= 5]  # Filter for real workload
-
-    fig = px.scatter(
-        goalie_data,
-        x="SV%",
-        y="GAA",
-        text="Player",
-        hover_data=["GP"],
-        color="Player",
-        title="Flyers Goalies: Save % vs Goals Against Average (GAA)"
-    )
-
-    fig.update_traces(marker=dict(size=12), textposition="top center")
-    fig.update_layout(
-        xaxis_title="Save Percentage (SV%)",
-        yaxis_title="Goals Against Average (GAA)",
-        height=600
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    def save_pct_vs_gaa_chart():
+        goalie_data = flyers_goalie[["Player", "SV%", "GAA", "GP"]].dropna()
+        goalie_data = goalie_data[goalie_data["GP"] >= 5]  # Filter for real workload
+
+        fig = px.scatter(
+            goalie_data,
+            x="SV%",
+            y="GAA",
+            text="Player",
+            hover_data=["GP"],
+            color="Player",
+            title=f"{nickname} Goalies: Save % vs Goals Against Average (GAA)"
+        )
+
+        fig.update_traces(marker=dict(size=12), textposition="top center")
+        fig.update_layout(
+            xaxis_title="Save Percentage (SV%)",
+            yaxis_title="Goals Against Average (GAA)",
+            height=600
+        )
+        return fig
+    prerender.plotly_chart("goalie.save_pct_vs_gaa", save_pct_vs_gaa_chart, width="stretch")
 
     st.caption(
-        "This chart compares each Flyers goalie’s Save Percentage (SV%) to their Goals Against Average (GAA). "
+        f"This chart compares each {nickname} goalie’s Save Percentage (SV%) to their Goals Against Average (GAA). "
         "Goalies in the bottome right combine high save rates with low goals allowed, indicating elite performance. "
         "Those in the top left may be struggling under pressure. This chart helps GMs and coaches evaluate goalie efficiency and reliability across different workloads."
     )
 
 
 # --------------------------- TAB 4 ---------------------------
-with tabs[4]:
-    st.header("Compare Two Flyers Players")
-
-    players = flyers_advanced['Player'].dropna().unique().tolist()
-    p1 = st.selectbox("Select Player 1", players)
-    p2 = st.selectbox("Select Player 2", players, index=1)
-
-    # Pull G and A stats
-    comp_df = flyers_advanced[flyers_advanced["Player"].isin([p1, p2])][["Player", "G", "A"]]
-    comp_df = comp_df.rename(columns={"G": "Goals", "A": "Assists"})
-
-    # Reshape: Player as x-axis, bars = stat categories
-    comp_melted = comp_df.melt(id_vars="Player", var_name="Stat", value_name="Total")
-
-    # Bar chart: x = Player, grouped by Stat
-    fig = px.bar(
-        comp_melted,
-        x="Player",
-        y="Total",
-        color="Stat",
-        barmode="group",
-        text="Total",
-        color_discrete_sequence=["#636EFA", "#EF553B"],
-        title=f"{p1} vs {p2}: Offensive Output (Goals & Assists)"
-    )
+@tab_fragment
+def render_player_compare_tab():
+    import plotly.express as px
+    from features import FEATURE_MIN_GP
+    from similarity import PCT_COLUMNS, similarity_index
 
-    fig.update_traces(textposition="outside", marker_line_width=1)
-    fig.update_layout(
-        yaxis_title="Total",
-        xaxis_title="",
-        height=500,
-        legend=dict(title="", orientation="h", y=1.02, x=1, xanchor='right'),
-        bargap=0.25
-    )
+    team, season = current_partition()
+    st.header(f"Compare {team_label(team).split()[-1]} Players")
 
-    st.plotly_chart(fig)
+    flyers_advanced = query_skaters(COMPARE_COLUMNS)
+    players = flyers_advanced['Player'].dropna().unique().tolist()
+    selected = st.multiselect("Select players", players, default=players[:2])
+    if not selected:
+        st.info("Pick at least one player to compare.")
+        return
+
+    def goals_assists_chart():
+        # Pull G and A stats
+        comp_df = flyers_advanced[flyers_advanced["Player"].isin(selected)][["Player", "G", "A"]]
+        comp_df = comp_df.rename(columns={"G": "Goals", "A": "Assists"})
+
+        # Reshape: Player as x-axis, bars = stat categories
+        comp_melted = comp_df.melt(id_vars="Player", var_name="Stat", value_name="Total")
+
+        # Bar chart: x = Player, grouped by Stat
+        fig = px.bar(
+            comp_melted,
+            x="Player",
+            y="Total",
+            color="Stat",
+            barmode="group",
+            text="Total",
+            color_discrete_sequence=["#636EFA", "#EF553B"],
+            title=f"{' vs '.join(selected)}: Offensive Output (Goals & Assists)"
+        )
+
+        fig.update_traces(textposition="outside", marker_line_width=1)
+        fig.update_layout(
+            yaxis_title="Total",
+            xaxis_title="",
+            height=500,
+            legend=dict(title="", orientation="h", y=1.02, x=1, xanchor='right'),
+            bargap=0.25
+        )
+        return fig
+    prerender.plotly_chart(f"compare.goals_assists[{'|'.join(selected)}]", goals_assists_chart)
 
     st.caption(
-        f"This comparison shows how {p1} and {p2} contribute offensively in terms of goals and assists. "
+        f"This comparison shows how {', '.join(selected)} contribute offensively in terms of goals and assists. "
         "With players on the x-axis and stat categories as grouped bars, it's easy to distinguish pure scorers from playmakers. "
         "This view supports lineup optimization and player usage decisions by surfacing where each player adds value on the scoresheet."
     )
-    
-    with tabs[5]:
-        from rink_map import render_rink_tab
-        render_rink_tab()
+
+    # League percentile profiles come straight from the precomputed feature store
+    index = similarity_index(season)
+    profiles = index.lookup(team, selected)
+    if not profiles.empty:
+        st.subheader("League Percentile Profile")
+        def percentile_chart():
+            pct = profiles.melt(id_vars="Player", value_vars=PCT_COLUMNS, var_name="Stat", value_name="Percentile")
+            pct["Stat"] = pct["Stat"].str.removesuffix(" pct")
+            fig_pct = px.bar(pct, x="Stat", y="Percentile", color="Player", barmode="group",
+                             title=f"Percentile Rank vs Every NHL Skater ({season}, Min {FEATURE_MIN_GP} GP)")
+            fig_pct.update_layout(yaxis_range=[0, 100], xaxis_title="", height=450)
+            return fig_pct
+        prerender.plotly_chart(f"compare.percentiles[{'|'.join(profiles['Player'])}]", percentile_chart)
+
+    st.subheader("Most Similar Skaters League-Wide")
+    col1, col2 = st.columns([3, 1])
+    target = col1.selectbox("Find players similar to", profiles["Player"].tolist() or selected)
+    k = col2.number_input("How many", min_value=1, max_value=50, value=10)
+    similar = index.most_similar(team, target, int(k))
+    if similar.empty:
+        st.info(f"{target} has fewer than {FEATURE_MIN_GP} games played, so there is no feature vector to match on.")
+    else:
+        similar["Team"] = similar["Team"].map(team_label)
+        st.dataframe(similar[["Team", "Player", "Pos", "GP", "Distance"] + PCT_COLUMNS], hide_index=True)
+        st.caption(
+            "Similarity is the distance between standardized possession (CF%, FF%, shot attempts for and against), "
+            "deployment (zone starts, ice time) and per-game scoring rates, measured against every skater in the league "
+            "for the season. Percentile columns rank each player against the same league-wide pool."
+        )
+
+
+# --------------------------- TAB 5 ---------------------------
+@tab_fragment
+def render_rink_map_tab():
+    from rink_map import render_rink_tab
+    render_rink_tab(load_data())
+
+
+# --------------------------- PAGE ---------------------------
+TABS = {
+    tab_names.SKATER_VISUALS: render_skater_tab,
+    tab_names.TEAM_SUMMARY: render_team_summary_tab,
+    tab_names.LEAGUE_STATS: render_league_tab,
+    tab_names.GOALIE_STATS: render_goalie_tab,
+    tab_names.PLAYER_COMPARE: render_player_compare_tab,
+    tab_names.RINK_MAP: render_rink_map_tab,
+}
+
+# Only the selected team/season partition is read from the database
+team, season = partition_selector()
+with st.sidebar:
+    refresh_on_new_data()
+st.title(f"{team_label(team)} Advanced Analytics Dashboard")
+
+# on_change="rerun" makes .open reflect the selected tab, so closed tabs don't run
+tabs = st.tabs(list(TABS), key="active_tab", on_change="rerun")
+for tab, render in zip(tabs, TABS.values()):
+    if tab.open:
+        with tab:
+            render()
+
+# Warm the closed tabs' data and the indexes they query (the Skater tab's
+# leaders, the League tab's leaderboard, the Compare tab's similar players) in
+# the background so switching tabs doesn't wait on SQLite or an index build
+prefetch([(COMPARE_COLUMNS, None)], LEAGUE_COLUMNS,
+         skater_indexes=[(SKATER_VISUALS_COLUMNS, SKATER_TAB_MIN_GP)], league_index=True, similarity=True)
+
+render_debug_panel()
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+# Marker layout for the interactive heatmap in map.py. Everything is computed
+# as whole columns (stacking offsets, colorscale indices, hover text) instead
+# of looping over rows, so it scales to every skater in the league.
+
+OFFSET_STEP = 3
+WEBGL_THRESHOLD = 1000   # switch to a WebGL scatter past this many points
+
+
+def assign_defense(pos):
+    # Alternate defensemen between the D1 and D2 slots by row order
+    pos = pos.to_numpy(dtype=object)
+    pair_slot = np.where(np.arange(len(pos)) % 2 == 0, 'D1', 'D2')
+    return np.where(pos == 'D', pair_slot, pos)
+
+
+def color_indices(values, vmin, vmax, n_colors):
+    values = np.asarray(values, dtype=float)
+    span = vmax - vmin
+    scaled = (values - vmin) / span if span else np.zeros_like(values)
+    return (np.clip(scaled, 0, 1) * (n_colors - 1)).astype(int)
+
+
+def layout_markers(players, position_coords, colors, vmin, vmax, offset_step=OFFSET_STEP):
+    # players needs Player, Pos, PosMapped and G columns
+    df = players[players['PosMapped'].isin(list(position_coords))]
+    slot = df['PosMapped']
+
+    # Stack players that share a slot vertically, centred on the slot
+    order = df.groupby('PosMapped', sort=False).cumcount().to_numpy()
+    counts = slot.map(slot.value_counts()).to_numpy()
+    base_x = slot.map({k: v[0] for k, v in position_coords.items()}).to_numpy(dtype=float)
+    base_y = slot.map({k: v[1] for k, v in position_coords.items()}).to_numpy(dtype=float)
+
+    goals = df['G'].to_numpy(dtype=float)
+    goal_text = pd.Series(goals.astype(int), index=df.index).astype(str)
+
+    return pd.DataFrame({
+        'x': base_x,
+        'y': base_y + (order - (counts - 1) / 2) * offset_step,
+        'color_index': color_indices(goals, vmin, vmax, len(colors)),
+        'hover': (df['Player'].astype(str) + "<br>Goals: " + goal_text + "<br>Position: " + df['Pos'].astype(str)).to_numpy(),
+    })
+
+
+def marker_trace(markers, colors, size=14):
+    import plotly.graph_objects as go
+
+    # Colors go out as colorscale indices: plotly validates numeric arrays in bulk
+    # but checks color strings one by one. Each index lands exactly on its stop.
+    last = max(len(colors) - 1, 1)
+    colorscale = [[i / last, color] for i, color in enumerate(colors)]
+
+    trace_type = go.Scattergl if len(markers) > WEBGL_THRESHOLD else go.Scatter
+    return trace_type(
+        x=markers['x'],
+        y=markers['y'],
+        mode='markers',
+        marker=dict(size=size, color=markers['color_index'], colorscale=colorscale, cmin=0, cmax=last),
+        hovertext=markers['hover'],
+        hoverinfo="text"
+    )
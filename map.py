@@ -1,24 +1,40 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-import matplotlib.colors as mcolors
-
-# Load and clean data
-df = pd.read_csv("flyers_standard_2024.csv")
-players = df[['Unnamed: 1', 'Unnamed: 3', 'Scoring']].copy()
-players.columns = ['Player', 'Pos', 'G']
-players = players[players['G'] != 'G']
-players.dropna(subset=['Player', 'Pos', 'G'], inplace=True)
-players = players[players['Player'].str.strip() != '']
-players['G'] = pd.to_numeric(players['G'], errors='coerce').fillna(0)
-
-# Assign D1/D2 positions
-def assign_defense(index, pos):
-    if pos == 'D':
-        return 'D1' if index % 2 == 0 else 'D2'
-    return pos
-players['PosMapped'] = [assign_defense(i, p) for i, p in enumerate(players['Pos'])]
+
+from data_store import data_version, load_data, partition_selector, refresh_on_new_data, shot_grid, shot_players, team_label
+from metrics import cache_call, cache_miss, render_debug_panel, span
+from heatmap_layout import assign_defense, layout_markers, marker_trace
+from query_engine import StatIndex
+from shots import LAYERS, RINK_LENGTH_FT, RINK_WIDTH_FT, TEAM_ROW, bin_sizes
+import prerender
+
+# Team/season partition to show
+team, season = partition_selector()
+with st.sidebar:
+    refresh_on_new_data()
+
+# Load and clean data once per data version and partition, indexed so the
+# sidebar filters below are binary searches instead of a scan per rerun
+@st.cache_resource(max_entries=8)
+def player_index(version, team, season):
+    cache_miss("map.player_index")
+    players = load_data(team, season).standard[['Player', 'Pos', 'G']].copy()
+    players.dropna(subset=['Player', 'Pos', 'G'], inplace=True)
+    players = players[players['Player'].str.strip() != '']
+    players['G'] = pd.to_numeric(players['G'], errors='coerce').fillna(0)
+
+    # Assign D1/D2 positions
+    players['PosMapped'] = assign_defense(players['Pos'])
+    return StatIndex(players, categories=['PosMapped'])
+
+
+with span("map.load_players"):
+    cache_call("map.player_index")
+    index = player_index(data_version(), team, season)
+    players = index.frame
 
 # Position coordinates (goalie on right)
 position_coords = {
@@ -33,77 +49,103 @@ st.sidebar.header("Filters")
 available_positions = list(position_coords.keys())
 selected_positions = st.sidebar.multiselect("Select Positions", available_positions, default=available_positions)
 
-# Slider for goal range
-min_goals = int(players['G'].min())
-max_goals = int(players['G'].max())
-goal_range = st.sidebar.slider("Select Goal Range", min_value=min_goals, max_value=max_goals, value=(min_goals, max_goals))
+# Slider for goal range (a slider needs two distinct ends)
+if not len(index):
+    st.info(f"No skaters with goal totals for {team_label(team)} in {season} yet.")
+    st.stop()
+min_goals, max_goals = (int(goals) for goals in index.bounds('G'))
+if min_goals < max_goals:
+    goal_range = st.sidebar.slider("Select Goal Range", min_value=min_goals, max_value=max_goals, value=(min_goals, max_goals))
+else:
+    goal_range = (min_goals, max_goals)
 
 # Filter data
-filtered = players[
-    (players['PosMapped'].isin(selected_positions)) &
-    (players['G'] >= goal_range[0]) &
-    (players['G'] <= goal_range[1])
-]
-
-# Normalize colors
-norm = mcolors.Normalize(vmin=players['G'].min(), vmax=players['G'].max())
-colors = px.colors.sequential.Hot
-position_counts = filtered['PosMapped'].value_counts().to_dict()
-offsets = {k: 0 for k in position_coords}
-offset_step = 3
-
-# Build Plotly data
-x_vals, y_vals, labels, hovers, marker_colors = [], [], [], [], []
-for _, row in filtered.iterrows():
-    pos = row['PosMapped']
-    if pos in position_coords:
-        base_x, base_y = position_coords[pos]
-        offset = offsets[pos]
-        y_offset = base_y + (offset - (position_counts[pos] - 1) / 2) * offset_step
-        x_vals.append(base_x)
-        y_vals.append(y_offset)
-        labels.append(f"{row['Player']} ({int(row['G'])})")
-        hovers.append(f"{row['Player']}<br>Goals: {int(row['G'])}<br>Position: {row['Pos']}")
-        color_index = int(norm(row['G']) * (len(colors) - 1))
-        marker_colors.append(colors[color_index])
-        offsets[pos] += 1
-
-# Create plot
-fig = go.Figure(go.Scatter(
-    x=x_vals,
-    y=y_vals,
-    mode='markers',
-    marker=dict(size=14, color=marker_colors),
-    hovertext=hovers,
-    hoverinfo="text"
-))
-
-
-import base64
-
-# Convert image to base64
-with open("ice hockey rink.jpg", "rb") as image_file:
-    encoded_image = base64.b64encode(image_file.read()).decode()
-
-# Update Plotly layout to include the image
-fig.update_layout(
-    title="Flyers Player Interactive Heatmap",
-    xaxis=dict(range=[0, 100], showgrid=False, visible=False),
-    yaxis=dict(range=[0, 42], showgrid=False, visible=False),
-    images=[dict(
-        source=f"data:image/jpg;base64,{encoded_image}",
-        xref="x", yref="y",
-        x=0, y=42,  # top-left corner of image
-        sizex=100, sizey=42,
-        sizing="stretch",
-        opacity=1.0,
-        layer="below"
-    )],
-    plot_bgcolor='white',
-    width=1000,
-    height=500
-)
+filtered = index.take(index.select(ranges={'G': goal_range}, isin={'PosMapped': selected_positions}))
+
+# Where the boards sit on the rink image, in the 100 x 42 plot units it is stretched over
+RINK_EXTENT = {"x": (5.2, 94.8), "y": (8.9, 33.2)}
+
+
+def rink_layout(fig, title):
+    from assets import rink_data_uri
+
+    # Update Plotly layout to include the image
+    fig.update_layout(
+        title=title,
+        xaxis=dict(range=[0, 100], showgrid=False, visible=False),
+        yaxis=dict(range=[0, 42], showgrid=False, visible=False),
+        images=[dict(
+            source=rink_data_uri("heatmap"),
+            xref="x", yref="y",
+            x=0, y=42,  # top-left corner of image
+            sizex=100, sizey=42,
+            sizing="stretch",
+            opacity=1.0,
+            layer="below"
+        )],
+        plot_bgcolor='white',
+        width=1000,
+        height=500
+    )
+    return fig
+
+
+def heatmap_figure():
+    # Stacking offsets, colors and hover text for every player at once
+    colors = px.colors.sequential.Hot
+    with span("map.layout"):
+        markers = layout_markers(filtered, position_coords, colors,
+                                 vmin=min_goals, vmax=max_goals)
+
+    # Create plot (WebGL once there are too many points for SVG)
+    with span("map.figure"):
+        fig = go.Figure(marker_trace(markers, colors))
+
+    return rink_layout(fig, f"{team_label(team)} Player Interactive Heatmap")
+
 
 # Show chart
-st.title("Interactive Flyers Player Heatmap")
-st.plotly_chart(fig, use_container_width=False)
\ No newline at end of file
+st.title(f"Interactive {team_label(team).split()[-1]} Player Heatmap")
+# Only the default filters are pre-rendered by report.py; the id carries the filter state
+figure_id = f"map.heatmap[{','.join(selected_positions)}|{goal_range[0]}-{goal_range[1]}]"
+with span("map.st_plotly_chart"):
+    prerender.plotly_chart(figure_id, heatmap_figure, width="content")
+
+
+# Shot density from the grids build_db.py pre-bins at ingest: one small
+# decode per view, whatever the number of shot events behind it
+st.subheader("Shot Density")
+shooters = shot_players(team, season)
+if not shooters:
+    st.info(f"No shot events for {team_label(team)} {season}. Add {team}_shots_{season}.csv "
+            "(Player, Event, X, Y) and run build_db.py.")
+else:
+    st.sidebar.header("Shot Density")
+    shooter = st.sidebar.selectbox("Shooter", shooters, format_func=lambda p: "All skaters" if p == TEAM_ROW else p)
+    layer = st.sidebar.selectbox("Events", list(LAYERS))
+    bin_ft = st.sidebar.select_slider("Bin size (ft)", options=bin_sizes(), value=4)
+    grid = shot_grid(shooter, layer, bin_sizes().index(bin_ft), team, season)
+
+    def density_figure():
+        counts, size, total = grid
+        rows, cols = counts.shape
+        (x0, x1), (y0, y1) = RINK_EXTENT["x"], RINK_EXTENT["y"]
+        # Bin centers, from feet off the rink corner to plot units
+        x = x0 + (np.arange(cols) + 0.5) * size / RINK_LENGTH_FT * (x1 - x0)
+        y = y0 + (np.arange(rows) + 0.5) * size / RINK_WIDTH_FT * (y1 - y0)
+        fig = go.Figure(go.Heatmap(
+            z=np.where(counts > 0, counts, np.nan), x=x, y=y,
+            colorscale="YlOrRd", opacity=0.75, hoverongaps=False,
+            colorbar=dict(title=layer),
+            hovertemplate=f"%{{z:.0f}} {layer.lower()}<extra></extra>",
+        ))
+        who = team_label(team) if shooter == TEAM_ROW else shooter
+        return rink_layout(fig, f"{who} {layer} ({total:,}, {size} ft bins)")
+
+    if grid is None:
+        st.info(f"No {layer.lower()} recorded for {shooter}.")
+    else:
+        with span("map.shot_density"):
+            prerender.plotly_chart(f"map.shot_density[{shooter}|{layer}|{bin_ft}]", density_figure, width="content")
+
+render_debug_panel()
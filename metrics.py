@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Hot-path timing spans and cache counters.
+# Numbers are process-wide (every session adds to the same totals), so they
+# describe the server under real multi-user load. Open the app with ?debug=1
+# to see them in the sidebar. Set NHL_METRICS_FILE to a *.json or *.prom path
+# to have them written out periodically for scraping.
+
+METRICS_FILE = os.environ.get("NHL_METRICS_FILE")
+EXPORT_INTERVAL_S = 10
+
+_lock = threading.Lock()
+_spans = {}      # name -> [count, total_ms, max_ms, last_ms]
+_calls = {}      # cache name -> lookups
+_misses = {}     # cache name -> lookups that had to compute
+_registered = {}  # cache name -> object with hits/misses attributes (render_cache.LRUCache)
+_last_export = 0.0
+
+
+def record(name, elapsed_ms):
+    with _lock:
+        stats = _spans.setdefault(name, [0, 0.0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed_ms
+        stats[2] = max(stats[2], elapsed_ms)
+        stats[3] = elapsed_ms
+
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+
+def timed(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache_call(cache):
+    with _lock:
+        _calls[cache] = _calls.get(cache, 0) + 1
+
+
+def cache_miss(cache):
+    # Call from inside the cached function body, which only runs on a miss
+    with _lock:
+        _misses[cache] = _misses.get(cache, 0) + 1
+
+
+def register_cache(cache, obj):
+    # For caches that count their own hits and misses
+    with _lock:
+        _registered[cache] = obj
+
+
+def snapshot():
+    with _lock:
+        spans = {
+            name: {"count": c, "total_ms": round(t, 3), "mean_ms": round(t / c, 3), "max_ms": round(m, 3), "last_ms": round(last, 3)}
+            for name, (c, t, m, last) in sorted(_spans.items())
+        }
+        caches = {}
+        for cache in sorted(set(_calls) | set(_misses)):
+            calls, misses = _calls.get(cache, 0), _misses.get(cache, 0)
+            # Misses can outnumber calls when a cached function is also called directly
+            caches[cache] = {"hits": max(calls - misses, 0), "misses": misses}
+        for cache, obj in sorted(_registered.items()):
+            caches[cache] = {"hits": obj.hits, "misses": obj.misses}
+    return {"timestamp": time.time(), "pid": os.getpid(), "spans": spans, "caches": caches}
+
+
+def to_prometheus(snap):
+    lines = [
+        "# HELP nhl_span_seconds_total Total time spent in an instrumented span.",
+        "# TYPE nhl_span_seconds_total counter",
+    ]
+    lines += [f'nhl_span_seconds_total{{span="{name}"}} {s["total_ms"] / 1000:.6f}' for name, s in snap["spans"].items()]
+    lines += ["# HELP nhl_span_calls_total Times an instrumented span ran.", "# TYPE nhl_span_calls_total counter"]
+    lines += [f'nhl_span_calls_total{{span="{name}"}} {s["count"]}' for name, s in snap["spans"].items()]
+    lines += ["# HELP nhl_span_max_seconds Slowest run of an instrumented span.", "# TYPE nhl_span_max_seconds gauge"]
+    lines += [f'nhl_span_max_seconds{{span="{name}"}} {s["max_ms"] / 1000:.6f}' for name, s in snap["spans"].items()]
+    lines += ["# HELP nhl_cache_requests_total Cache lookups by result.", "# TYPE nhl_cache_requests_total counter"]
+    for cache, c in snap["caches"].items():
+        lines.append(f'nhl_cache_requests_total{{cache="{cache}",result="hit"}} {c["hits"]}')
+        lines.append(f'nhl_cache_requests_total{{cache="{cache}",result="miss"}} {c["misses"]}')
+    return "\n".join(lines) + "\n"
+
+
+def export(path):
+    snap = snapshot()
+    text = to_prometheus(snap) if path.endswith(".prom") else json.dumps(snap, indent=2)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def maybe_export(path=METRICS_FILE):
+    # Called at the end of every script run; writes at most every EXPORT_INTERVAL_S
+    global _last_export
+    if not path or time.time() - _last_export < EXPORT_INTERVAL_S:
+        return
+    _last_export = time.time()
+    export(path)
+
+
+def render_debug_panel():
+    import pandas as pd
+    import streamlit as st
+
+    maybe_export()
+    if st.query_params.get("debug") != "1":
+        return
+
+    snap = snapshot()
+    with st.sidebar.expander("Performance (debug)", expanded=True):
+        st.caption(f"Process {snap['pid']}, totals across all sessions")
+        if snap["spans"]:
+            spans = pd.DataFrame.from_dict(snap["spans"], orient="index").sort_values("total_ms", ascending=False)
+            st.dataframe(spans[["count", "last_ms", "mean_ms", "max_ms"]], width="stretch")
+        if snap["caches"]:
+            st.dataframe(pd.DataFrame.from_dict(snap["caches"], orient="index"), width="stretch")
+        st.download_button("metrics.json", json.dumps(snap, indent=2), file_name="metrics.json")
+        st.download_button("metrics.prom", to_prometheus(snap), file_name="metrics.prom")
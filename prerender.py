@@ -0,0 +1,165 @@
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import metrics
+from render_cache import LRUCache
+
+# Pre-rendered and cached figures.
+# Tabs draw every chart through plotly_chart()/image() with a figure id and a
+# build function. If report.py has exported the current (team, season) at the
+# current data version, the stored figure is served and build() never runs.
+# Otherwise the figure is built once and kept serialized (Plotly JSON or PNG
+# bytes) in a process-wide cache keyed on (figure id, team, season) for the
+# current data version, so every later view from any session skips the build.
+# Figure ids carry any widget state the chart depends on, so each filter or
+# selection gets its own entry; only the default view is ever pre-rendered.
+
+REPORT_DIR = os.environ.get("NHL_REPORT_DIR", "reports")
+MANIFEST = "manifest.json"
+FIGURE_CACHE_ENTRIES = 256
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+
+_figures = LRUCache(max_entries=FIGURE_CACHE_ENTRIES, max_bytes=FIGURE_CACHE_BYTES)
+metrics.register_cache("figures", _figures)
+
+_capture = None   # list that collects built figures while report.py exports
+_capture_lock = threading.Lock()
+
+
+def partition_dir(team, season, root=REPORT_DIR):
+    return os.path.join(root, f"{team}_{season}")
+
+
+def figure_file(fig_id):
+    # Readable but filesystem-safe; the hash keeps long widget-state ids unique
+    slug = re.sub(r"[^a-z0-9]+", "-", fig_id.lower()).strip("-")[:60]
+    return f"{slug}-{hashlib.sha1(fig_id.encode()).hexdigest()[:8]}"
+
+
+@functools.lru_cache(maxsize=64)
+def _read_manifest(path, mtime_ns):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@functools.cache
+def _spec_figure_class():
+    # Defined lazily so importing this module doesn't import plotly
+    from plotly.basedatatypes import BaseFigure
+
+    class SpecFigure(BaseFigure):
+        # A figure already serialized to Plotly JSON. st.plotly_chart validates
+        # a plain dict by building a go.Figure from it (as slow as the original
+        # build); a BaseFigure is trusted and only asked for to_dict()
+        def __init__(self, spec):
+            self._spec = spec
+
+        def to_dict(self):
+            return json.loads(self._spec)
+
+    return SpecFigure
+
+
+def _serialize(kind, payload):
+    if kind == "png":
+        return payload
+    import plotly.io as pio
+
+    return pio.to_json(payload, validate=False)
+
+
+def _deserialize(kind, data):
+    return data if kind == "png" else _spec_figure_class()(data)
+
+
+@functools.lru_cache(maxsize=128)
+def _read_payload(path, mtime_ns, kind):
+    if kind == "png":
+        with open(path, "rb") as f:
+            return f.read()
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _stat_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def lookup(fig_id, kind):
+    # Stored figure for the current partition, or None if there isn't a current one
+    from data_store import current_partition, data_version
+
+    folder = partition_dir(*current_partition())
+    path = os.path.join(folder, MANIFEST)
+    mtime_ns = _stat_ns(path)
+    if mtime_ns is None:
+        return None
+    manifest = _read_manifest(path, mtime_ns)
+    entry = manifest["figures"].get(fig_id)
+    if entry is None or entry["kind"] != kind or manifest["data_version"] != data_version():
+        return None
+    payload_path = os.path.join(folder, entry["file"])
+    payload_mtime = _stat_ns(payload_path)
+    return None if payload_mtime is None else _read_payload(payload_path, payload_mtime, kind)
+
+
+def _cached(fig_id, kind, build):
+    # Serialized figure from the process-wide cache, building it on a miss
+    from data_store import current_partition, data_version
+
+    key = (fig_id, kind, *current_partition())
+    version = data_version()
+    data = _figures.get(key, version)
+    if data is None:
+        with metrics.span(f"figure.build[{fig_id.split('[')[0]}]"):
+            data = _figures.put(key, _serialize(kind, build()), version)
+    return data
+
+
+def _figure(fig_id, kind, build):
+    if _capture is not None:
+        payload = build()
+        with _capture_lock:
+            _capture.append((fig_id, kind, payload))
+        return payload
+
+    metrics.cache_call("prerendered")
+    data = lookup(fig_id, kind)
+    if data is None:
+        metrics.cache_miss("prerendered")
+        data = _cached(fig_id, kind, build)
+    return _deserialize(kind, data)
+
+
+def plotly_chart(fig_id, build, **kwargs):
+    # st.plotly_chart(build(), **kwargs); stored figures come back as a SpecFigure
+    import streamlit as st
+
+    st.plotly_chart(_figure(fig_id, "plotly", build), **kwargs)
+
+
+def image(fig_id, build, **kwargs):
+    # st.image(build(), **kwargs) for charts rendered to PNG bytes
+    import streamlit as st
+
+    st.image(_figure(fig_id, "png", build), **kwargs)
+
+
+@contextmanager
+def capture():
+    # Used by report.py: build every figure fresh and collect (fig_id, kind, payload)
+    global _capture
+    figures = []
+    _capture = figures
+    try:
+        yield figures
+    finally:
+        _capture = None
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import data_store
+import metrics
+
+# Indexed filters and leaderboards over a player table.
+# A StatIndex is built once per data version (it is cached with the frame it
+# indexes) and keeps, for every numeric column, the row ids sorted by value.
+# A range filter is then two binary searches, several filters are combined by
+# checking the smallest candidate set against the other columns, and a top-k
+# is a slice of the sorted index (or an O(n) partition of a filtered set)
+# instead of a full sort. Category columns (positions, teams) are grouped
+# once so "Pos in (C, LW)" is a lookup too.
+
+
+class StatIndex:
+    def __init__(self, frame, categories=()):
+        self.frame = frame.reset_index(drop=True)
+        self._values = {}   # column -> float values by row (NaN for missing)
+        self._asc = {}      # column -> non-missing row ids by value, ties in row order
+        self._desc = {}     # the same, largest first
+        self._sorted = {}   # column -> values in _asc order, for binary search
+        for col in self.frame.columns:
+            series = self.frame[col]
+            if col in categories or not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                continue
+            values = series.to_numpy(dtype=float, na_value=np.nan)
+            present = np.flatnonzero(~np.isnan(values))
+            self._values[col] = values
+            self._asc[col] = present[np.argsort(values[present], kind="stable")]
+            self._sorted[col] = values[self._asc[col]]
+            self._desc[col] = present[np.argsort(-values[present], kind="stable")]
+
+        self._codes = {}    # column -> category code by row
+        self._lookup = {}   # column -> {value: code}
+        self._groups = {}   # column -> (row ids grouped by code, where each code's group starts)
+        for col in categories:
+            codes, uniques = pd.factorize(self.frame[col])
+            by_code = np.argsort(codes, kind="stable")
+            self._codes[col] = codes
+            self._lookup[col] = {value: i for i, value in enumerate(uniques)}
+            self._groups[col] = by_code, np.searchsorted(codes[by_code], np.arange(len(uniques) + 1))
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def stats(self):
+        # Columns that support range filters and leaderboards
+        return list(self._values)
+
+    def bounds(self, column):
+        # (min, max) of the non-missing values, read off the sorted index
+        sorted_values = self._sorted[column]
+        if not len(sorted_values):
+            return np.nan, np.nan
+        return sorted_values[0], sorted_values[-1]
+
+    def _range_span(self, column, low, high):
+        sorted_values = self._sorted[column]
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side="left")
+        stop = len(sorted_values) if high is None else np.searchsorted(sorted_values, high, side="right")
+        return start, stop
+
+    def _category_codes(self, column, keys):
+        return [self._lookup[column][key] for key in keys if key in self._lookup[column]]
+
+    def _category_rows(self, column, codes):
+        by_code, starts = self._groups[column]
+        return np.concatenate([by_code[starts[c]:starts[c + 1]] for c in codes] or [np.empty(0, dtype=np.intp)])
+
+    def select(self, ranges=None, isin=None):
+        # Row ids, in frame order, matching every filter. ranges maps a column to
+        # an inclusive (low, high), either end None for open; isin maps a
+        # category column to the values to keep. Rows missing a filtered stat never match.
+        filters = [("range", col, bounds) for col, bounds in (ranges or {}).items()]
+        filters += [("isin", col, keys) for col, keys in (isin or {}).items()]
+        if not filters:
+            return np.arange(len(self))
+
+        # Count each filter's matches from the indexes alone, materialize the
+        # most selective one and check the others against its rows
+        spans = [
+            self._range_span(col, *arg) if kind == "range" else self._category_codes(col, arg)
+            for kind, col, arg in filters
+        ]
+        sizes = [
+            span[1] - span[0] if kind == "range" else sum(np.diff(self._groups[col][1])[span])
+            for (kind, col, _), span in zip(filters, spans)
+        ]
+        first = int(np.argmin(sizes))
+        kind, col, _ = filters[first]
+        rows = self._asc[col][slice(*spans[first])] if kind == "range" else self._category_rows(col, spans[first])
+        for i, (kind, col, arg) in enumerate(filters):
+            if i == first or not len(rows):
+                continue
+            if kind == "range":
+                values = self._values[col][rows]
+                keep = ~np.isnan(values)
+                if arg[0] is not None:
+                    keep &= values >= arg[0]
+                if arg[1] is not None:
+                    keep &= values <= arg[1]
+            else:
+                keep = np.isin(self._codes[col][rows], spans[i])
+            rows = rows[keep]
+        return np.sort(rows)
+
+    def top(self, column, k=None, rows=None, ascending=False):
+        # Row ids of the k best values of column (all of them if k is None),
+        # best first, ties in frame order; rows restricts it to a select() result
+        order = self._asc[column] if ascending else self._desc[column]
+        if rows is None:
+            return order[:k]
+
+        values = self._values[column][rows]
+        keep = ~np.isnan(values)
+        rows, values = rows[keep], values[keep]
+        keys = values if ascending else -values
+        if k is not None and k < len(rows):
+            # Partial selection: everything strictly better than the k-th value,
+            # then as many of the rows tied with it as fit, earliest first
+            kth = np.partition(keys, k - 1)[k - 1]
+            better = keys < kth
+            tied = np.flatnonzero(keys == kth)[: k - np.count_nonzero(better)]
+            picked = np.concatenate([np.flatnonzero(better), tied])
+            rows, keys = rows[picked], keys[picked]
+        return rows[np.lexsort((rows, keys))]
+
+    def take(self, rows):
+        return self.frame.iloc[rows]
+
+
+@st.cache_resource(max_entries=16)
+def _skater_index(version, columns, team, season, min_gp):
+    metrics.cache_miss("skater_index")
+    # The keyed read behind query_skaters(): data_store.prefetch() builds this
+    # off the script thread, where the session's partition isn't available
+    frame = data_store._query_skaters(version, columns, team, season, min_gp)
+    with metrics.span("query_engine.build_index"):
+        return StatIndex(frame, categories=["Pos"] if "Pos" in frame.columns else ())
+
+
+def skater_index(columns=None, team=None, season=None, min_gp=None):
+    # One team/season's skaters, as query_skaters() returns them
+    metrics.cache_call("skater_index")
+    default_team, default_season = data_store.current_partition()
+    return _skater_index(data_store.data_version(), tuple(columns) if columns else None,
+                         team or default_team, season or default_season, min_gp)
+
+
+@st.cache_resource(max_entries=2)
+def _league_index(version):
+    metrics.cache_miss("league_skater_index")
+    frame = data_store._query_skaters(version, None, None, None, None)
+    with metrics.span("query_engine.build_index"):
+        return StatIndex(frame, categories=["Team", "Pos"])
+
+
+def league_index():
+    # Every skater season loaded, for league-wide filters and leaderboards
+    metrics.cache_call("league_skater_index")
+    return _league_index(data_store.data_version())
@@ -0,0 +1,72 @@
+import sys
+import threading
+from collections import OrderedDict
+
+# Small process-wide LRU cache for rendered output (PNG bytes, figure specs).
+# It is shared by every Streamlit session in the process. Entries are dropped
+# when the data version changes and evicted least-recently-used first once
+# either the entry or byte budget is exceeded.
+
+
+def _sizeof(value):
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    def __init__(self, max_entries=32, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        # Everything cached for an older data version is stale
+        if version != self.version:
+            self._entries.clear()
+            self._bytes = 0
+            self.version = version
+
+    def get(self, key, version=None):
+        with self._lock:
+            self._check_version(version)
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value, version=None):
+        size = _sizeof(value)
+        with self._lock:
+            self._check_version(version)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return value
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._bytes -= self._entries.popitem(last=False)[1][1]
+        return value
+
+    def get_or_create(self, key, create, version=None):
+        value = self.get(key, version)
+        if value is None:
+            value = self.put(key, create(), version)
+        return value
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
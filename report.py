@@ -0,0 +1,187 @@
+import argparse
+import html
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Batch export of every dashboard chart.
+# Drives final_project.py (every tab) and map.py headlessly through Streamlit's
+# AppTest for each team/season, collects the figures the tabs build (see
+# prerender.py) and writes a report bundle: one folder per partition with the
+# figures as Plotly JSON, standalone HTML and PNG, an index.html that opens
+# offline, and a manifest stamped with the data version. While the stamp
+# matches the database, the app serves these figures instead of rebuilding them.
+#
+#   python report.py                           # default team/season
+#   python report.py --team flyers --season 2024
+#   python report.py --all --workers 4
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, APP_DIR)
+
+from tab_names import TAB_NAMES as TABS
+
+PAGES = {"final_project.py": TABS, "map.py": [None]}
+PLOTLY_JS = "plotly.min.js"
+
+
+def _run_pages(team, season, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    for page, tabs in PAGES.items():
+        for tab in tabs:
+            at = AppTest.from_file(os.path.join(APP_DIR, page), default_timeout=timeout)
+            at.session_state["team"] = team
+            at.session_state["season"] = season
+            if tab is not None:
+                at.session_state["active_tab"] = tab
+            at.run()
+            if at.exception:
+                raise RuntimeError(f"{page} [{tab or 'page'}] raised: {at.exception[0].value}")
+
+
+def _write_figure(folder, fig_id, kind, payload, png):
+    import plotly.io as pio
+    import prerender
+
+    name = os.path.join("figures", prerender.figure_file(fig_id))
+    entry = {"kind": kind}
+    if kind == "png":
+        entry["file"] = f"{name}.png"
+        with open(os.path.join(folder, entry["file"]), "wb") as f:
+            f.write(payload)
+        return entry, f'<img src="{entry["file"]}" style="max-width:100%">'
+
+    entry["file"] = f"{name}.json"
+    with open(os.path.join(folder, entry["file"]), "w", encoding="utf-8") as f:
+        f.write(pio.to_json(payload, validate=False))
+    entry["html"] = f"{name}.html"
+    pio.write_html(payload, os.path.join(folder, entry["html"]), include_plotlyjs=f"../../{PLOTLY_JS}")
+    if png:
+        # Static images need kaleido; skip quietly per figure if it isn't there
+        try:
+            pio.write_image(payload, os.path.join(folder, f"{name}.png"))
+            entry["png"] = f"{name}.png"
+        except (ValueError, ImportError):
+            pass
+    return entry, pio.to_html(payload, full_html=False, include_plotlyjs=False)
+
+
+def export_partition(team, season, out_dir, db_path=None, png=False, timeout=120):
+    # One team/season; runs in a worker process
+    os.chdir(APP_DIR)   # the app resolves the rink image relative to the working directory
+    import data_store
+    import prerender
+
+    if db_path:
+        data_store.DB_PATH = db_path
+    # Read the stamp before rendering: if an ingest lands mid-export the bundle
+    # is marked with the older version and the app treats it as stale. The
+    # stamp carries the database's generation id, so a bundle exported from
+    # another or an earlier (rebuilt) database never matches either.
+    version = data_store.data_version()
+    start = time.perf_counter()
+    with prerender.capture() as captured:
+        _run_pages(team, season, timeout)
+
+    folder = prerender.partition_dir(team, season, out_dir)
+    os.makedirs(os.path.join(folder, "figures"), exist_ok=True)
+    figures, sections = {}, []
+    for fig_id, kind, payload in captured:
+        if fig_id in figures:
+            continue
+        figures[fig_id], fragment = _write_figure(folder, fig_id, kind, payload, png)
+        sections.append(f"<section><h2>{html.escape(fig_id)}</h2>{fragment}</section>")
+
+    title = f"{data_store.team_label(team)} {season}"
+    with open(os.path.join(folder, "index.html"), "w", encoding="utf-8") as f:
+        f.write(
+            f'<!doctype html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+            f'<script src="../{PLOTLY_JS}"></script></head><body>'
+            f"<h1>{html.escape(title)}</h1><p>Data version {version}</p>{''.join(sections)}</body></html>"
+        )
+
+    manifest = {
+        "team": team,
+        "season": season,
+        "data_version": version,
+        "database": os.path.abspath(data_store.DB_PATH),
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "figures": figures,
+    }
+    # Manifest goes last and atomically, so the app never sees it point at missing files
+    tmp_path = os.path.join(folder, f"{prerender.MANIFEST}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(folder, prerender.MANIFEST))
+    return {"team": team, "season": season, "data_version": version, "figures": len(figures),
+            "seconds": round(time.perf_counter() - start, 2)}
+
+
+def write_bundle_index(out_dir, results):
+    import plotly.offline
+
+    # plotly.js once for the whole bundle so every page opens offline
+    with open(os.path.join(out_dir, PLOTLY_JS), "w", encoding="utf-8") as f:
+        f.write(plotly.offline.get_plotlyjs())
+    links = "".join(
+        f'<li><a href="{r["team"]}_{r["season"]}/index.html">{html.escape(r["team"])} {r["season"]}</a> '
+        f'({r["figures"]} figures, data version {r["data_version"]})</li>'
+        for r in results
+    )
+    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(f'<!doctype html><html><head><meta charset="utf-8"><title>NHL report</title></head><body><ul>{links}</ul></body></html>')
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "partitions": results}, f, indent=2)
+
+
+def export(partitions, out_dir, db_path=None, workers=None, png=False):
+    os.makedirs(out_dir, exist_ok=True)
+    out_dir = os.path.abspath(out_dir)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(partitions) == 1:
+        results = [export_partition(team, season, out_dir, db_path, png) for team, season in partitions]
+    else:
+        # Submit through the importable module: AppTest swaps sys.modules["__main__"]
+        # for the page it runs, so a worker can't resolve __main__.export_partition
+        from report import export_partition as worker
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(worker, team, season, out_dir, db_path, png) for team, season in partitions]
+            results = [future.result() for future in futures]
+
+    # Keep any partitions exported by earlier runs in the bundle index
+    previous = os.path.join(out_dir, "manifest.json")
+    if os.path.exists(previous):
+        with open(previous, encoding="utf-8") as f:
+            done = {(r["team"], r["season"]) for r in results}
+            results += [r for r in json.load(f)["partitions"] if (r["team"], r["season"]) not in done]
+    results.sort(key=lambda r: (r["team"], r["season"]))
+    write_bundle_index(out_dir, results)
+    return results
+
+
+if __name__ == "__main__":
+    import data_store
+    import prerender
+
+    parser = argparse.ArgumentParser(description="Pre-render every dashboard chart to a static report bundle.")
+    parser.add_argument("--team", default=data_store.DEFAULT_TEAM)
+    parser.add_argument("--season", type=int, default=data_store.DEFAULT_SEASON)
+    parser.add_argument("--all", action="store_true", help="every team/season in the database")
+    parser.add_argument("--out", default=prerender.REPORT_DIR)
+    parser.add_argument("--db", help="database to read (default: the app's)")
+    parser.add_argument("--workers", type=int, help="render processes (default: one per CPU)")
+    parser.add_argument("--png", action="store_true", help="also write Plotly figures as PNG (needs kaleido)")
+    args = parser.parse_args()
+
+    if args.db:
+        data_store.DB_PATH = args.db
+    partitions = data_store.partitions() if args.all else [(args.team, args.season)]
+
+    start = time.perf_counter()
+    results = export(partitions, args.out, args.db, args.workers, args.png)
+    elapsed = time.perf_counter() - start
+    exported = [r for r in results if (r["team"], r["season"]) in set(partitions)]
+    print(f"✅ {sum(r['figures'] for r in exported)} figures for {len(exported)} team/season(s) in {elapsed:.1f}s -> {args.out}/index.html")
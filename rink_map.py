@@ -1,20 +1,25 @@
-def render_rink_tab():  
-    import streamlit as st
-    import matplotlib.pyplot as plt
-    import matplotlib.image as mpimg
-    import pandas as pd
+import metrics
+import prerender
+from render_cache import LRUCache
+
+# Positions as fractions of the rink image (x, y)
+POSITION_LAYOUT = {
+    'LW': (0.50, 0.35),
+    'C':  (0.50, 0.50),
+    'RW': (0.50, 0.65),
+    'LD': (0.60, 0.35),
+    'RD': (0.60, 0.65),
+}
 
-    st.header("This map shows the top goal scorer for each position on the Philadelphia Flyers")
+# Finished PNGs keyed on (view, layout), dropped whenever the data version changes
+_render_cache = LRUCache(max_entries=8)
+metrics.register_cache("rink_png", _render_cache)
 
-    # Load your image
-    rink_img = mpimg.imread("ice hockey rink.jpg")
-    shape = rink_img.shape
-    height, width = shape[:2]
 
-    # Load player data
-    df = pd.read_csv("flyers_standard_2024.csv", skiprows=1)
-    df.columns = df.columns.str.strip().str.replace(" ", "_")
-    df = df[['Player', 'Pos', 'G']].dropna()
+def top_scorers_by_position(standard):
+    import pandas as pd
+
+    df = standard[['Player', 'Pos', 'G']].dropna()
     df['G'] = pd.to_numeric(df['G'], errors='coerce')
     df = df.dropna(subset=['G'])
     df = df[~df['Pos'].str.contains("G")]
@@ -22,34 +27,64 @@ def render_rink_tab():
     # Select top per position
     forwards = df[df['Pos'].isin(['LW', 'C', 'RW'])].sort_values("G", ascending=False).drop_duplicates(subset=["Pos"])
     defensemen = df[df['Pos'].str.startswith("D")].sort_values("G", ascending=False).head(2).copy()
-    defensemen['Pos'] = ['LD', 'RD']
-    top_by_position = pd.concat([forwards, defensemen])
+    defensemen['Pos'] = ['LD', 'RD'][:len(defensemen)]
+    return pd.concat([forwards, defensemen])
+
+
+@metrics.timed("rink.draw")
+def render_rink_png(top_by_position, rink_img, layout=POSITION_LAYOUT):
+    import io
+    from matplotlib.figure import Figure
+
+    height, width = rink_img.shape[:2]
 
     # Coordinates in pixel space
-    position_coords = {
-        'LW': (int(width * 0.50), int(height * 0.35)),
-        'C':  (int(width * 0.50), int(height * 0.50)),
-        'RW': (int(width * 0.50), int(height * 0.65)),
-        'LD': (int(width * 0.60), int(height * 0.35)),
-        'RD': (int(width * 0.60), int(height * 0.65)),
-    }
-
-    # Create clean white canvas
-    fig, ax = plt.subplots(figsize=(width / 60, height / 60), dpi=100)
+    players = top_by_position[top_by_position['Pos'].isin(list(layout))]
+    xs = [int(width * layout[pos][0]) for pos in players['Pos']]
+    ys = [int(height * layout[pos][1]) for pos in players['Pos']]
+
+    # Create clean white canvas (Figure directly, so nothing lingers in pyplot's global state)
+    fig = Figure(figsize=(width / 60, height / 60), dpi=100)
     fig.patch.set_facecolor('white')
+    ax = fig.subplots()
     ax.set_facecolor('white')
     ax.imshow(rink_img)
     ax.axis('off')
-    plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
-
-    # Plot players
-    for _, row in top_by_position.iterrows():
-        pos = row['Pos']
-        if pos in position_coords:
-            x, y = position_coords[pos]
-            ax.scatter(x, y, s=350, color='orange', edgecolors='black', zorder=3)
-            label = f"{row['Player']}\nGoals: {int(row['G'])}"
-            ax.text(x, y - 20, label, color='black', fontsize=8, ha='center', va='bottom', weight='bold', zorder=4)
-
-    # Display
-    st.pyplot(fig)
+    fig.subplots_adjust(left=0, right=1, top=1, bottom=0)
+
+    # One scatter call for every player
+    ax.scatter(xs, ys, s=350, color='orange', edgecolors='black', zorder=3)
+    for x, y, player, goals in zip(xs, ys, players['Player'], players['G']):
+        label = f"{player}\nGoals: {int(goals)}"
+        ax.text(x, y - 20, label, color='black', fontsize=8, ha='center', va='bottom', weight='bold', zorder=4)
+
+    # Same settings st.pyplot uses
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=200, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+@metrics.timed("rink.render_tab")
+def render_rink_tab(data=None):
+    import streamlit as st
+    from assets import rink_array
+    from data_store import load_data, team_label
+
+    if data is None:
+        data = load_data()
+
+    st.header(f"This map shows the top goal scorer for each position on the {team_label(data.team)}")
+
+    key = ("rink_map", data.team, data.season, tuple(sorted(POSITION_LAYOUT.items())))
+
+    def build():
+        return _render_cache.get_or_create(
+            key,
+            # Decoded once and memory-mapped, see assets.py
+            lambda: render_rink_png(top_scorers_by_position(data.standard), rink_array("rink_map")),
+            version=data.version,
+        )
+
+    # Display (report.py may have pre-rendered it)
+    with metrics.span("rink.st_image"):
+        prerender.image("rink.top_scorers", build, width="stretch")
@@ -0,0 +1,162 @@
+import os
+import shutil
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# Shot-location store and density pyramid for the map.py heatmap.
+# Event-level shots (millions of rows a season across the league) are kept
+# next to the database as a columnar store: one directory per (team, season),
+# one part per ingested CSV, and every column a .npy file that can be
+# memory-mapped. At ingest each partition is binned into 2D histograms for the
+# whole team and for every shooter, per event layer and at several bin sizes,
+# so the app decodes one small pre-binned grid per chart instead of scanning
+# events.
+
+RINK_LENGTH_FT = 200
+RINK_WIDTH_FT = 85
+BASE_BIN_FT = 1
+LEVELS = 4   # pyramid levels: 1, 2, 4 and 8 ft bins
+EVENTS = ["SHOT", "MISS", "BLOCK", "GOAL"]
+LAYERS = {"Attempts": EVENTS, "On goal": ["SHOT", "GOAL"], "Goals": ["GOAL"]}
+TEAM_ROW = "ALL"   # Player value of the whole-team grids
+
+# Columns read from a <team>_shots_<season>.csv export (one header row; any
+# other columns are ignored). X/Y are feet from center ice.
+SHOT_COLUMNS = {"Player": "str", "Event": "str", "X": "float32", "Y": "float32"}
+STORE_COLUMNS = ["x", "y", "event", "player"]
+
+
+def store_dir(db_name):
+    # nhl_data.db -> nhl_data_shots/
+    return f"{os.path.splitext(db_name)[0]}_shots"
+
+
+def bin_sizes():
+    return [BASE_BIN_FT * 2 ** level for level in range(LEVELS)]
+
+
+def event_columns(df):
+    # Compact columns for one export. Teams switch ends between periods, so
+    # every shot is turned to attack the right-hand net (x > 0).
+    x = df["X"].to_numpy(dtype=np.float32)
+    y = df["Y"].to_numpy(dtype=np.float32)
+    flip = x < 0
+    codes, players = pd.factorize(df["Player"].astype("string").str.strip(), use_na_sentinel=True)
+    event = pd.Categorical(df["Event"].astype("string").str.upper(), categories=EVENTS).codes
+    return {
+        "x": np.where(flip, -x, x).astype(np.float32),
+        "y": np.where(flip, -y, y).astype(np.float32),
+        "event": event.astype(np.int8),          # -1 for event types not in EVENTS
+        "player": codes.astype(np.int32),        # -1 for a missing shooter
+    }, np.asarray(players, dtype=str)
+
+
+def write_part(root, team, season, part, df):
+    # Replace one part of a partition: columns go to a scratch directory that
+    # is swapped in, so a reader never sees a half-written part
+    columns, players = event_columns(df)
+    folder = os.path.join(root, f"{team}_{season}")
+    target = os.path.join(folder, part)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), values)
+    np.save(os.path.join(tmp_path, "players.npy"), players)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(tmp_path, target)
+    return len(df)
+
+
+def clear_store(root):
+    shutil.rmtree(root, ignore_errors=True)
+
+
+def staging_dir(root):
+    # Where a full rebuild writes its store until the database commits
+    return f"{root}.{os.getpid()}.new"
+
+
+def swap_store(staged, root):
+    # Put a fully written store in place of the live one. A build that stored
+    # no shot files leaves no staged store, and the live one is just removed.
+    old = f"{root}.{os.getpid()}.old"
+    if os.path.exists(root):
+        os.replace(root, old)
+    if os.path.exists(staged):
+        os.replace(staged, root)
+    clear_store(old)
+
+
+def read_partition(root, team, season):
+    # Every part of a partition as one set of columns, with shooter codes
+    # remapped onto a shared, sorted player list
+    folder = os.path.join(root, f"{team}_{season}")
+    parts = sorted(
+        entry.path for entry in os.scandir(folder) if entry.is_dir() and not entry.name.endswith(".tmp")
+    ) if os.path.isdir(folder) else []
+    columns = {name: [] for name in STORE_COLUMNS}
+    names = []
+    for path in parts:
+        for name in STORE_COLUMNS:
+            columns[name].append(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        names.append(np.load(os.path.join(path, "players.npy")))
+
+    players, inverse = np.unique(np.concatenate(names) if names else np.array([], dtype=str), return_inverse=True)
+    offsets = np.cumsum([0] + [len(n) for n in names])
+    codes = []
+    for part_codes, offset in zip(columns["player"], offsets):
+        codes.append(np.where(part_codes >= 0, inverse[np.maximum(part_codes, 0) + offset], -1))
+    events = {
+        name: np.concatenate(values) if values else np.array([], dtype=np.float32)
+        for name, values in columns.items() if name != "player"
+    }
+    events["player"] = np.concatenate(codes) if codes else np.array([], dtype=np.int32)
+    return events, players
+
+
+def pyramid(grid):
+    # Halve the resolution LEVELS - 1 times by summing 2 x 2 blocks
+    levels = [grid]
+    for _ in range(LEVELS - 1):
+        rows, cols = grid.shape
+        padded = np.zeros((rows + rows % 2, cols + cols % 2), dtype=grid.dtype)
+        padded[:rows, :cols] = grid
+        grid = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).sum(axis=(1, 3))
+        levels.append(grid)
+    return levels
+
+
+def density_grids(events, players):
+    # Yields (player, layer, level, bin_ft, counts) for the team (TEAM_ROW) and
+    # every shooter. One bincount per layer bins all shooters at once.
+    cols = RINK_LENGTH_FT // BASE_BIN_FT
+    rows = -(-RINK_WIDTH_FT // BASE_BIN_FT)
+    ix = np.clip(((events["x"] + RINK_LENGTH_FT / 2) // BASE_BIN_FT).astype(np.int64), 0, cols - 1)
+    iy = np.clip(((events["y"] + RINK_WIDTH_FT / 2) // BASE_BIN_FT).astype(np.int64), 0, rows - 1)
+    cell = iy * cols + ix
+    # Shots without a shooter still count for the team, in an extra slot
+    shooter = np.where(events["player"] >= 0, events["player"], len(players)).astype(np.int64)
+    sizes = bin_sizes()
+
+    for layer, layer_events in LAYERS.items():
+        mask = np.isin(events["event"], [EVENTS.index(e) for e in layer_events])
+        counts = np.bincount(
+            shooter[mask] * (rows * cols) + cell[mask], minlength=(len(players) + 1) * rows * cols
+        ).reshape(len(players) + 1, rows, cols).astype(np.uint32)
+        grids = [(TEAM_ROW, counts.sum(axis=0, dtype=np.uint32))]
+        grids += [(player, counts[i]) for i, player in enumerate(players) if counts[i].any()]
+        for player, grid in grids:
+            for level, (bin_ft, level_grid) in enumerate(zip(sizes, pyramid(grid))):
+                yield player, layer, level, bin_ft, level_grid
+
+
+def encode(grid):
+    # Mostly empty ice, so the counts compress to a few KB
+    return zlib.compress(np.ascontiguousarray(grid, dtype="<u4").tobytes())
+
+
+def decode(blob, rows, cols):
+    return np.frombuffer(zlib.decompress(blob), dtype="<u4").reshape(rows, cols)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import data_store
+import metrics
+from features import PLAYER_FEATURES
+
+# Similar-player search for the Player Compare tab.
+# build_db.py stores one standardized feature vector per skater and season in
+# player_features. Each season's vectors go into a KD-tree once per data
+# version, so "most similar skaters league-wide" is a tree query and an N-way
+# comparison is a handful of row lookups, never a scan over the league.
+
+Z_COLUMNS = [f"{name} z" for name in PLAYER_FEATURES]
+PCT_COLUMNS = [f"{name} pct" for name in PLAYER_FEATURES]
+
+
+class SimilarityIndex:
+    def __init__(self, features):
+        from scipy.spatial import KDTree
+
+        self.profiles = features.drop(columns=Z_COLUMNS).reset_index(drop=True)
+        self.vectors = features[Z_COLUMNS].to_numpy(dtype=float)
+        self.tree = KDTree(self.vectors) if len(self.vectors) else None
+        self._rows = {key: i for i, key in enumerate(zip(self.profiles["Team"], self.profiles["Player"]))}
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def lookup(self, team, players):
+        # Profiles for the given players of one team, in the order asked for
+        rows = [self._rows[(team, player)] for player in players if (team, player) in self._rows]
+        return self.profiles.iloc[rows].reset_index(drop=True)
+
+    def most_similar(self, team, player, k=10):
+        row = self._rows.get((team, player))
+        if row is None or self.tree is None:
+            return self.profiles.iloc[0:0].assign(Distance=pd.Series(dtype=float))
+        # Ask for one extra neighbour because the player is their own nearest
+        # match; a list of ranks keeps the result an array even for k=1
+        dist, idx = self.tree.query(self.vectors[row], k=list(range(1, min(k + 1, len(self)) + 1)))
+        keep = idx != row
+        neighbours = self.profiles.iloc[idx[keep][:k]].reset_index(drop=True)
+        neighbours.insert(neighbours.columns.get_loc("GP") + 1, "Distance", np.round(dist[keep][:k], 3))
+        return neighbours
+
+
+@st.cache_resource(max_entries=4)
+def _index(version, season):
+    metrics.cache_miss("similarity_index")
+    with data_store.connection() as conn, metrics.span("sqlite.read[player_features]"):
+        features = pd.read_sql('SELECT * FROM player_features WHERE "Season" = ?', conn, params=[season])
+    with metrics.span("similarity.build_index"):
+        return SimilarityIndex(features.drop(columns="Season"))
+
+
+def similarity_index(season=None):
+    metrics.cache_call("similarity_index")
+    return _index(data_store.data_version(), season or data_store.current_partition()[1])
+
+
+@metrics.timed("similarity.query")
+def most_similar(team, season, player, k=10):
+    return similarity_index(season).most_similar(team, player, k)
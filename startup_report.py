@@ -0,0 +1,123 @@
+import argparse
+import ast
+import json
+import subprocess
+import sys
+
+import tab_names
+
+# Import-time report for the dashboard's cold start.
+# Runs `python -X importtime` in a fresh interpreter for the modules
+# final_project.py imports at the top level (what every cold start pays) and
+# for the extra modules each tab imports when it first renders, then compares
+# the totals against import_budget.json so CI can catch regressions.
+#
+#   python startup_report.py                          # print the report
+#   python startup_report.py --check import_budget.json --json startup_report.json
+
+APP = "final_project.py"
+
+# Extra modules each tab pulls in the first time it renders
+TAB_MODULES = {
+    tab_names.SKATER_VISUALS: ["plotly.express", "query_engine", "clustering", "sklearn.cluster", "sklearn.preprocessing"],
+    tab_names.TEAM_SUMMARY: ["plotly.express"],
+    tab_names.LEAGUE_STATS: ["query_engine"],
+    tab_names.GOALIE_STATS: ["matplotlib.pyplot", "plotly.express"],
+    # scipy.spatial comes in with the similarity index, which the app's
+    # prefetch builds in the background before the tab is opened
+    tab_names.PLAYER_COMPARE: ["plotly.express", "similarity"],
+    tab_names.RINK_MAP: ["rink_map", "assets", "matplotlib.figure", "PIL.Image"],
+}
+
+
+def top_level_imports(path=APP):
+    # Modules imported at module level (not inside functions) by the app script
+    tree = ast.parse(open(path, encoding="utf-8").read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def import_time_ms(modules, preloaded=()):
+    # Cumulative import time of `modules` in a fresh interpreter, not counting
+    # anything already pulled in by `preloaded`
+    if not modules:
+        return 0.0, {}
+    code = "".join(f"import {m}\n" for m in preloaded) + "import sys; sys.stderr.write('--- measure ---\\n')\n"
+    code += "".join(f"import {m}\n" for m in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+    )
+    lines = result.stderr.split("--- measure ---\n", 1)[1].splitlines()
+
+    per_module = {}
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        # Top-level entries have no indentation in the package column
+        raw_name = line.rsplit("|", 1)[1]
+        if cumulative.isdigit() and raw_name.startswith(" ") and not raw_name.startswith("  "):
+            per_module[name] = int(cumulative) / 1000
+    return sum(per_module.values()), per_module
+
+
+def build_report(runs=3):
+    startup = top_level_imports()
+    # Take the best of a few runs to smooth out disk cache noise
+    startup_ms, startup_modules = min((import_time_ms(startup) for _ in range(runs)), key=lambda r: r[0])
+    tabs = {}
+    for tab, modules in TAB_MODULES.items():
+        tabs[tab] = round(min(import_time_ms(modules, preloaded=startup)[0] for _ in range(runs)), 1)
+    return {
+        "startup_modules": startup,
+        "startup_ms": round(startup_ms, 1),
+        "startup_breakdown_ms": {name: round(ms, 1) for name, ms in sorted(startup_modules.items(), key=lambda kv: -kv[1])},
+        "tab_ms": tabs,
+    }
+
+
+def check(report, budget):
+    failures = []
+    if report["startup_ms"] > budget["startup_ms"]:
+        failures.append(f"startup: {report['startup_ms']} ms > {budget['startup_ms']} ms")
+    for tab, limit in budget.get("tab_ms", {}).items():
+        actual = report["tab_ms"].get(tab, 0)
+        if actual > limit:
+            failures.append(f"{tab}: {actual} ms > {limit} ms")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure dashboard import time with -X importtime.")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--check", help="budget JSON file; exit 1 if any total is over budget")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    report = build_report(args.runs)
+    print(f"Cold start imports ({', '.join(report['startup_modules'])}): {report['startup_ms']} ms")
+    for name, ms in report["startup_breakdown_ms"].items():
+        print(f"  {name:<30} {ms:>8.1f} ms")
+    print("First render of each tab adds:")
+    for tab, ms in report["tab_ms"].items():
+        print(f"  {tab:<30} {ms:>8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.check:
+        with open(args.check) as f:
+            failures = check(report, json.load(f))
+        if failures:
+            print("\n❌ Over import-time budget:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print("\n✅ Within import-time budget")
@@ -0,0 +1,147 @@
+import argparse
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+# Synthetic league generator for benchmarks.
+# Writes CSVs in the same two-row-header Sports-Reference format as the real
+# exports in this folder, for N teams x M seasons. Rows are resampled from the
+# real Flyers/NHL files with some noise so every column keeps a realistic type
+# and range. The first team is always "flyers" so the dashboard runs unchanged
+# against the generated database. With --shots it also writes event-level shot
+# locations (<team>_shots_<season>.csv) for the map.py density heatmap.
+
+TEMPLATE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+TEAM_KINDS = ["advanced", "standard", "goalie", "misc"]
+LEAGUE_KINDS = ["team_stats", "advanced"]
+LAST_SEASON = 2024
+
+
+def read_template(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f))
+    return rows[0], rows[1], [row for row in rows[2:] if any(row)]
+
+
+def _jitter(value, rng):
+    # Keep the template's formatting: integers stay integers, times stay m:ss
+    if value == "":
+        return value
+    if ":" in value:
+        minutes, seconds = value.split(":")
+        total = max(int(int(minutes) * 60 + int(seconds) * rng.uniform(0.8, 1.2)), 0)
+        return f"{total // 60}:{total % 60:02d}"
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    scaled = number * rng.uniform(0.8, 1.2)
+    if value.lstrip("-").isdigit():
+        return str(int(round(scaled)))
+    decimals = len(value.split(".")[1]) if "." in value else 0
+    return f"{scaled:.{decimals}f}"
+
+
+def synth_rows(template_rows, n_rows, rng, name_col, name_prefix, keep_cols=()):
+    rows = []
+    for i in range(n_rows):
+        source = template_rows[rng.integers(len(template_rows))]
+        row = [value if col in keep_cols else _jitter(value, rng) for col, value in enumerate(source)]
+        row[0] = str(i + 1)
+        row[name_col] = f"{name_prefix} {i + 1:02d}"
+        rows.append(row)
+    return rows
+
+
+def write_csv(path, group_row, header_row, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(group_row)
+        writer.writerow(header_row)
+        writer.writerows(rows)
+
+
+def synth_shots(n_shots, players, season, rng):
+    # Attempts at the net on the goal line 89 ft from center, denser in the slot.
+    # Teams attack the other end in the second period, like the real feeds.
+    distance = rng.gamma(2.0, 12.0, n_shots)
+    angle = np.clip(rng.normal(0, 0.6, n_shots), -1.45, 1.45)
+    x = np.clip(89 - distance * np.cos(angle), -99, 99)
+    y = np.clip(distance * np.sin(angle), -42, 42)
+    period = rng.integers(1, 4, n_shots)
+    side = np.where(period == 2, -1, 1)
+
+    event = rng.choice(["SHOT", "MISS", "BLOCK"], n_shots, p=[0.5, 0.27, 0.23])
+    scored = (event == "SHOT") & (rng.random(n_shots) < np.clip(0.3 * np.exp(-distance / 12), 0.02, 0.3))
+    event[scored] = "GOAL"
+    days = rng.integers(0, 180, n_shots)
+    return pd.DataFrame({
+        "Date": pd.Timestamp(f"{season - 1}-10-10") + pd.to_timedelta(np.sort(days), unit="D"),
+        "Period": period,
+        "Player": rng.choice(players, n_shots, p=rng.dirichlet(np.ones(len(players)))),
+        "Event": event,
+        "X": np.round(x * side, 1),
+        "Y": np.round(y * side, 1),
+    })
+
+
+def team_slugs(n_teams):
+    return ["flyers"] + [f"team{i:02d}" for i in range(2, n_teams + 1)]
+
+
+def generate(out_dir, n_teams=32, n_seasons=1, skaters=30, goalies=5, seed=0, shots=0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    seasons = list(range(LAST_SEASON - n_seasons + 1, LAST_SEASON + 1))
+    teams = team_slugs(n_teams)
+    written = []
+
+    for kind in TEAM_KINDS:
+        group_row, header_row, template = read_template(os.path.join(TEMPLATE_FOLDER, f"flyers_{kind}_2024.csv"))
+        n_rows = goalies if kind == "goalie" else skaters
+        # Keep Pos (and Awards) verbatim, everything numeric gets jittered
+        keep = {i for i, name in enumerate(header_row) if name in ("Pos", "Awards")}
+        for season in seasons:
+            for team in teams:
+                path = os.path.join(out_dir, f"{team}_{kind}_{season}.csv")
+                # Players keep their names across the team's files so the advanced/standard join works
+                rows = synth_rows(template, n_rows, rng, 1, f"{team.title()} {'Goalie' if kind == 'goalie' else 'Skater'}", keep)
+                write_csv(path, group_row, header_row, rows)
+                written.append(path)
+
+    for kind in LEAGUE_KINDS:
+        group_row, header_row, template = read_template(os.path.join(TEMPLATE_FOLDER, f"nhl_{kind}_2024.csv"))
+        template = [row for row in template if row[0]]   # drop the League Average row
+        for season in seasons:
+            path = os.path.join(out_dir, f"nhl_{kind}_{season}.csv")
+            rows = synth_rows(template, n_teams, rng, 1, "Team")
+            for row, team in zip(rows, teams):
+                row[1] = "Philadelphia Flyers" if team == "flyers" else team.title()
+            write_csv(path, group_row, header_row, rows)
+            written.append(path)
+
+    if shots:
+        for season in seasons:
+            for team in teams:
+                path = os.path.join(out_dir, f"{team}_shots_{season}.csv")
+                players = [f"{team.title()} Skater {i + 1:02d}" for i in range(skaters)]
+                synth_shots(shots, players, season, rng).to_csv(path, index=False)
+                written.append(path)
+
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic league in Sports-Reference CSV format.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--teams", type=int, default=32)
+    parser.add_argument("--seasons", type=int, default=1)
+    parser.add_argument("--skaters", type=int, default=30, help="skaters per team and season")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shots", type=int, default=0, help="shot events per team and season")
+    args = parser.parse_args()
+
+    files = generate(args.out_dir, args.teams, args.seasons, args.skaters, seed=args.seed, shots=args.shots)
+    print(f"✅ Wrote {len(files)} CSVs to '{args.out_dir}'")
@@ -0,0 +1,13 @@
+# Dashboard tab labels, in display order. final_project.py builds its tabs from
+# these, and report.py, benchmark.py and startup_report.py select tabs by the
+# same names (AppTest's session_state["active_tab"]), so they live in a module
+# that can be imported without running the app.
+
+SKATER_VISUALS = "Skater Visuals"
+TEAM_SUMMARY = "Team Summary"
+LEAGUE_STATS = "League Stats"
+GOALIE_STATS = "Goalie Stats"
+PLAYER_COMPARE = "Player Compare"
+RINK_MAP = "Rink Map"
+
+TAB_NAMES = [SKATER_VISUALS, TEAM_SUMMARY, LEAGUE_STATS, GOALIE_STATS, PLAYER_COMPARE, RINK_MAP]
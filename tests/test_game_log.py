@@ -0,0 +1,80 @@
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import build_db  # noqa: E402
+
+EXPORTS = ["flyers_advanced_2024.csv", "flyers_standard_2024.csv", "flyers_goalie_2024.csv", "flyers_misc_2024.csv"]
+PLAYER = "Travis Konecny"
+
+
+def write_game_log(folder, name, rows):
+    # Game logs use the same two header rows as the season exports
+    lines = [",,,Scoring,,", "Date,Player,Pos,G,A", *rows]
+    (folder / name).write_text("\n".join(lines) + "\n")
+
+
+def skater(db_name, player=PLAYER):
+    with sqlite3.connect(db_name) as conn:
+        return conn.execute(
+            'SELECT s."GP", s."G", s."A", m."CF60" FROM skater_stats AS s JOIN skater_metrics AS m USING ("Team", "Season", "Player") '
+            'WHERE s."Team" = \'flyers\' AND s."Season" = 2024 AND s."Player" = ?', (player,)
+        ).fetchone()
+
+
+def roster_goals(db_name):
+    with sqlite3.connect(db_name) as conn:
+        return conn.execute("""SELECT "G" FROM team_rollup WHERE "Team" = 'flyers' AND "Season" = 2024 AND "Pos" = 'ALL'""").fetchone()[0]
+
+
+@pytest.fixture
+def season(tmp_path):
+    for name in EXPORTS:
+        shutil.copy(ROOT / name, tmp_path / name)
+    db_name = str(tmp_path / "test.db")
+    build_db.build(db_name, str(tmp_path), workers=1)
+    return tmp_path, db_name
+
+
+def test_logged_game_adds_to_the_export(season):
+    folder, db_name = season
+    gp, goals, assists, cf60 = skater(db_name)
+    team_goals = roster_goals(db_name)
+
+    write_game_log(folder, "flyers_games_2024_a.csv", [f"2024-04-20,{PLAYER},C,2,1"])
+    build_db.build(db_name, str(folder), workers=1)
+
+    assert skater(db_name) == (gp + 1, goals + 2, assists + 1, cf60)
+    assert roster_goals(db_name) == team_goals + 2
+
+
+def test_refreshed_export_covers_logged_games(season):
+    folder, db_name = season
+    exported = skater(db_name)
+    write_game_log(folder, "flyers_games_2024_a.csv", [f"2024-04-20,{PLAYER},C,2,1"])
+    build_db.build(db_name, str(folder), workers=1)
+
+    # A re-downloaded export already counts that game
+    with open(folder / "flyers_standard_2024.csv", "a") as f:
+        f.write("\n")
+    build_db.build(db_name, str(folder), workers=1)
+    assert skater(db_name) == exported
+
+    # and a full rebuild doesn't count it again from the old log
+    build_db.build(db_name, str(folder), full=True, workers=1)
+    assert skater(db_name) == exported
+
+
+def test_game_log_without_an_export_adds_no_partition(season):
+    folder, db_name = season
+    write_game_log(folder, "bruins_games_2024_a.csv", ["2024-04-20,David Pastrnak,RW,1,0"])
+    build_db.build(db_name, str(folder), workers=1)
+
+    with sqlite3.connect(db_name) as conn:
+        assert conn.execute('SELECT DISTINCT "Team" FROM skater_stats').fetchall() == [("flyers",)]